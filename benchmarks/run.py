@@ -0,0 +1,199 @@
+"""Time the freeze hot paths on synthetic workspaces.
+
+    python benchmarks/run.py                    # small scenario, compared to baselines
+    python benchmarks/run.py large --save       # record new baselines for large
+    python benchmarks/run.py small --lock-packages 800 --no-compare
+
+Each benchmark is repeated and its best time kept, peak memory is
+traced over one freeze of all the projects. These are compared
+to the stored baselines of the scenario and the run fails when any is
+worse than the baseline by more than the tolerance factor. Baselines
+are machine specific, record them on the runner they're checked on.
+"""
+
+import argparse
+from dataclasses import asdict, replace
+from itertools import chain
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from poetry.core.packages.dependency_group import MAIN_GROUP
+
+from poetry_plugin_freeze.app import project_roots
+from poetry_plugin_freeze.freeze import Fridge, IcedPoet
+
+from workspace import SCENARIOS, Scenario, generate_workspace
+
+BASELINES = Path(__file__).parent / "baselines.json"
+# absolute slack on top of the tolerance, so timer noise on benchmarks
+# taking a fraction of a millisecond isn't reported as a regression
+SLACK = {"peak_memory_mb": 1.0}
+SLACK_SECONDS = 0.005
+BENCHMARKS = (
+    "project_roots",
+    "iced_poet",
+    "get_dep_packages",
+    "get_frozen_deps",
+    "freeze_wheel",
+    "peak_memory_mb",
+)
+
+
+def best_of(repeat, func, setup=None):
+    """Best wall time of func over repeat runs, setup runs untimed before each."""
+    best = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_projects(projects):
+    loaded = [IcedPoet(p.path) for p in projects]
+    fridge = Fridge(loaded)
+    for iced in loaded:
+        iced.set_fridge(fridge)
+    return loaded
+
+
+def run_benchmarks(root, projects, repeat):
+    """Time each hot path over all the workspace's projects, in seconds."""
+    results = {}
+    results["project_roots"] = best_of(repeat, lambda: list(project_roots(root)))
+    results["iced_poet"] = best_of(repeat, lambda: [IcedPoet(p.path) for p in projects])
+
+    # the lock walk and the requirement formatting, on freshly loaded
+    # projects so per instance caches start out empty.
+    def walk(loaded):
+        for iced in loaded:
+            list(chain(iced.get_path_deps(MAIN_GROUP), iced.get_dep_packages()))
+
+    results["get_dep_packages"] = best_of(repeat, walk, lambda: (load_projects(projects),))
+
+    def dep_packages():
+        return (
+            [
+                (iced, list(chain(iced.get_path_deps(MAIN_GROUP), iced.get_dep_packages())))
+                for iced in load_projects(projects)
+            ],
+        )
+
+    def frozen_deps(loaded):
+        for iced, deps in loaded:
+            iced.get_frozen_deps(deps, iced.exclude_packages)
+
+    results["get_frozen_deps"] = best_of(repeat, frozen_deps, dep_packages)
+
+    loaded = load_projects(projects)
+    plans = [(iced.get_freeze_plan(), p.wheel) for iced, p in zip(loaded, projects)]
+    originals = {w: w.read_bytes() for _, w in plans}
+
+    def restore():
+        for w, content in originals.items():
+            w.write_bytes(content)
+        return ()
+
+    def freeze_wheels():
+        for plan, w in plans:
+            plan.freeze_wheel(w)
+
+    results["freeze_wheel"] = best_of(repeat, freeze_wheels, restore)
+    restore()
+    results["peak_memory_mb"] = peak_memory(projects) / (1024 * 1024)
+    return results
+
+
+def peak_memory(projects):
+    """Peak traced memory of freezing all the projects, as the command does."""
+    tracemalloc.start()
+    try:
+        fridge = Fridge(loader=IcedPoet)
+        for p in projects:
+            iced = fridge.load(p.path)
+            iced.set_fridge(fridge)
+            plan = iced.get_freeze_plan()
+            for w in iced.get_wheels():
+                iced.freeze_wheel(w, plan)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def load_baselines():
+    if not BASELINES.exists():
+        return {}
+    return json.loads(BASELINES.read_text())
+
+
+def compare(results, baseline, tolerance):
+    """Report each benchmark against its baseline, returning the regressed ones."""
+    regressed = []
+    for name in BENCHMARKS:
+        value = results[name]
+        unit = "M" if name.endswith("_mb") else "s"
+        expected = baseline.get(name)
+        if expected is None:
+            print(f"{name:<18} {value:8.4f}{unit}")
+            continue
+        ratio = value / expected
+        flag = ""
+        if value > expected * tolerance + SLACK.get(name, SLACK_SECONDS):
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:<18} {value:8.4f}{unit}  baseline {expected:8.4f}{unit}  x{ratio:.2f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", nargs="?", default="small", choices=sorted(SCENARIOS))
+    for field in asdict(Scenario()):
+        parser.add_argument("--" + field.replace("_", "-"), type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--save", action="store_true", help="store the results as baselines")
+    parser.add_argument("--no-compare", action="store_true", help="skip the baseline check")
+    args = parser.parse_args(argv)
+
+    overrides = {
+        field: getattr(args, field)
+        for field in asdict(Scenario())
+        if getattr(args, field) is not None
+    }
+    scenario = replace(SCENARIOS[args.scenario], **overrides)
+    # baselines only apply to the scenarios as defined
+    key = None if overrides else args.scenario
+    print(f"scenario {args.scenario}: {scenario}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir) / "workspace"
+        projects = generate_workspace(root, scenario)
+        results = run_benchmarks(root, projects, args.repeat)
+
+    baselines = load_baselines()
+    regressed = []
+    if args.no_compare or key is None:
+        compare(results, {}, args.tolerance)
+    else:
+        regressed = compare(results, baselines.get(key, {}), args.tolerance)
+
+    if args.save and key is not None:
+        baselines[key] = {name: round(results[name], 6) for name in BENCHMARKS}
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"saved baselines for {key} to {BASELINES}")
+
+    if regressed:
+        print(f"{len(regressed)} benchmark(s) regressed: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Synthetic mono-repo workspaces for the benchmarks.
+
+A workspace is a set of poetry projects under projects/, each with a
+lock file drawn from one shared universe of packages and a built wheel
+in its dist directory. Projects depend on a few earlier projects by
+path, universe packages depend on later ones under a rotating set of
+markers, and every few packages declare an extra, so the lock walk sees
+the same kinds of graphs as real locks.
+
+Everything is derived from the parameters and a seed, so a scenario
+generates the same workspace on every run.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import random
+import zipfile
+
+from poetry.factory import Factory
+
+DEP_MARKERS = (
+    "",
+    'python_version < "3.11"',
+    'python_version >= "3.10"',
+    'sys_platform == "win32"',
+    'platform_machine == "x86_64" and python_version >= "3.9"',
+)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    projects: int = 5
+    path_deps: int = 1
+    lock_packages: int = 100
+    extras: int = 2
+    wheel_members: int = 20
+    member_size: int = 4096
+    seed: int = 0
+
+
+SCENARIOS = {
+    "tiny": Scenario(projects=2, lock_packages=20, extras=1, wheel_members=5),
+    "small": Scenario(),
+    "large": Scenario(
+        projects=10,
+        path_deps=3,
+        lock_packages=300,
+        extras=4,
+        wheel_members=300,
+        member_size=32 * 1024,
+    ),
+}
+
+
+def package_name(idx):
+    return "pkg-%04d" % idx
+
+
+def project_name(idx):
+    return "proj-%04d" % idx
+
+
+def extra_package_name(project_idx, extra_idx):
+    return "ext-%04d-%d" % (project_idx, extra_idx)
+
+
+def toml_value(value):
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join(f"{k} = {toml_value(v)}" for k, v in value.items())
+    return json.dumps(value)
+
+
+def requirement(version, markers="", **options):
+    if not markers and not options:
+        return version
+    spec = {"version": version, **options}
+    if markers:
+        spec["markers"] = markers
+    return spec
+
+
+def as_table(spec):
+    return {"version": spec} if isinstance(spec, str) else dict(spec)
+
+
+class Universe:
+    """The locked packages shared by all projects of a workspace."""
+
+    def __init__(self, scenario):
+        rng = random.Random(scenario.seed)
+        self.size = scenario.lock_packages
+        self.dependencies = {}
+        self.extras = {}
+        for idx in range(self.size):
+            deps = {}
+            later = range(idx + 1, self.size)
+            for dep_idx in sorted(rng.sample(later, min(3, len(later)))):
+                markers = DEP_MARKERS[(idx + dep_idx) % len(DEP_MARKERS)]
+                deps[package_name(dep_idx)] = requirement(">=1.0", markers)
+            if idx % 7 == 0 and deps:
+                # the last dependency is only pulled in by the fast extra
+                optional = sorted(deps)[-1]
+                deps[optional] = {**as_table(deps[optional]), "optional": True}
+                self.extras[idx] = {"fast": [optional]}
+            self.dependencies[idx] = deps
+
+        # dependents ask for the extra of every package declaring one
+        for deps in self.dependencies.values():
+            for name, spec in deps.items():
+                if int(name.split("-")[1]) in self.extras:
+                    deps[name] = {**as_table(spec), "extras": ["fast"]}
+
+    def lock_entries(self):
+        for idx in range(self.size):
+            yield lock_entry(
+                package_name(idx),
+                "1.%d.0" % idx,
+                self.dependencies[idx],
+                extras=self.extras.get(idx),
+            )
+
+
+def lock_entry(name, version, dependencies, optional=False, extras=None, source=None):
+    lines = [
+        "[[package]]",
+        f'name = "{name}"',
+        f'version = "{version}"',
+        'description = ""',
+        f"optional = {str(optional).lower()}",
+        'python-versions = ">=3.8"',
+        "files = []",
+    ]
+    if source:
+        lines.append("develop = false")
+    if dependencies:
+        lines += ["", "[package.dependencies]"]
+        lines += [f"{dep} = {toml_value(spec)}" for dep, spec in sorted(dependencies.items())]
+    if extras:
+        lines += ["", "[package.extras]"]
+        lines += [f"{extra} = {toml_value(names)}" for extra, names in sorted(extras.items())]
+    if source:
+        lines += ["", "[package.source]", 'type = "directory"', f'url = "{source}"']
+    return "\n".join(lines) + "\n"
+
+
+class Project:
+    def __init__(self, idx, scenario, rng):
+        self.idx = idx
+        self.name = project_name(idx)
+        self.distro_name = self.name.replace("-", "_")
+        self.version = "1.0.%d" % idx
+        self.path_deps = [project_name(i) for i in range(max(0, idx - scenario.path_deps), idx)]
+        direct = rng.sample(range(scenario.lock_packages), max(1, scenario.lock_packages // 10))
+        self.dependencies = {
+            package_name(i): requirement(">=1.0", DEP_MARKERS[i % len(DEP_MARKERS)])
+            for i in sorted(direct)
+        }
+        self.extras = {"extra-%d" % i: [extra_package_name(idx, i)] for i in range(scenario.extras)}
+
+    def requirements(self):
+        requires = dict(self.dependencies)
+        for dep in self.path_deps:
+            requires[dep] = {"path": f"../{dep}"}
+        for (name,) in self.extras.values():
+            requires[name] = {"version": ">=1.0", "optional": True}
+        return requires
+
+    def pyproject(self):
+        lines = [
+            "[tool.poetry]",
+            f'name = "{self.name}"',
+            f'version = "{self.version}"',
+            'description = ""',
+            'authors = ["bench"]',
+            f'packages = [{{include = "{self.distro_name}"}}]',
+            "",
+            "[tool.poetry.dependencies]",
+            'python = "^3.9"',
+        ]
+        lines += [
+            f"{dep} = {toml_value(spec)}" for dep, spec in sorted(self.requirements().items())
+        ]
+        if self.extras:
+            lines += ["", "[tool.poetry.extras]"]
+            lines += [f"{extra} = {toml_value(names)}" for extra, names in self.extras.items()]
+        lines += [
+            "",
+            "[build-system]",
+            'requires = ["poetry-core"]',
+            'build-backend = "poetry.core.masonry.api"',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def write_lock(path, projects, project, universe, content_hash):
+    entries = list(universe.lock_entries())
+    # path dependencies, including those of path dependencies
+    pending = list(project.path_deps)
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        dep = projects[name]
+        pending.extend(dep.path_deps)
+        requires = dict(dep.dependencies)
+        for sub in dep.path_deps:
+            requires[sub] = {"path": f"../{sub}"}
+        entries.append(lock_entry(dep.name, dep.version, requires, source=f"../{dep.name}"))
+    for (name,) in project.extras.values():
+        entries.append(lock_entry(name, "1.0.0", {}, optional=True))
+
+    lines = ["# synthetic lock file generated for the benchmarks", ""]
+    lines.append("\n".join(entries))
+    if project.extras:
+        lines.append("[extras]")
+        lines += [f"{extra} = {toml_value(names)}" for extra, names in project.extras.items()]
+        lines.append("")
+    lines += [
+        "[metadata]",
+        'lock-version = "2.0"',
+        'python-versions = "^3.9"',
+        f'content-hash = "{content_hash}"',
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def member_data(name, size):
+    # compressible but not trivially so, like source code
+    seed = hashlib.sha256(name.encode()).hexdigest()
+    line = f"value_{seed[:12]} = {int(seed[12:20], 16)}  # {seed}\n".encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+def write_wheel(project, scenario):
+    dist_info = f"{project.distro_name}-{project.version}.dist-info"
+    metadata = [
+        "Metadata-Version: 2.1",
+        f"Name: {project.name}",
+        f"Version: {project.version}",
+        "Requires-Python: >=3.9,<4.0",
+    ]
+    metadata += [f"Provides-Extra: {extra}" for extra in project.extras]
+    metadata += [f"Requires-Dist: {dep} (>=1.0)" for dep in sorted(project.dependencies)]
+    members = [
+        (
+            f"{project.distro_name}/mod_{i:04d}.py",
+            member_data(f"{project.name}/{i}", scenario.member_size),
+        )
+        for i in range(scenario.wheel_members)
+    ]
+    members.append((f"{dist_info}/METADATA", ("\n".join(metadata) + "\n").encode()))
+    members.append((f"{dist_info}/WHEEL", b"Wheel-Version: 1.0\nRoot-Is-Purelib: true\n"))
+    record = "".join(f"{name},,\n" for name, _ in members) + f"{dist_info}/RECORD,,\n"
+    members.append((f"{dist_info}/RECORD", record.encode()))
+
+    dist_dir = project.path / "dist"
+    dist_dir.mkdir()
+    wheel = dist_dir / f"{project.distro_name}-{project.version}-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w", compression=zipfile.ZIP_DEFLATED) as whl:
+        for name, data in members:
+            whl.writestr(name, data)
+    return wheel
+
+
+def generate_workspace(root, scenario):
+    """Generate a workspace for the scenario below root, returning its projects."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "pyproject.toml").write_text("[tool.freeze]\n")
+
+    rng = random.Random(scenario.seed)
+    universe = Universe(scenario)
+    projects = {}
+    for idx in range(scenario.projects):
+        project = Project(idx, scenario, rng)
+        project.path = root / "projects" / project.name
+        projects[project.name] = project
+
+    factory = Factory()
+    for project in projects.values():
+        project.path.mkdir(parents=True)
+        (project.path / project.distro_name).mkdir()
+        (project.path / project.distro_name / "__init__.py").write_text("")
+        (project.path / "pyproject.toml").write_text(project.pyproject())
+        content_hash = factory.create_poetry(project.path).locker._get_content_hash()
+        write_lock(project.path / "poetry.lock", projects, project, universe, content_hash)
+        project.wheel = write_wheel(project, scenario)
+    return list(projects.values())
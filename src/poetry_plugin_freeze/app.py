@@ -1,32 +1,20 @@
-from base64 import urlsafe_b64encode
-import csv
-from email.parser import Parser
-from functools import lru_cache
-from itertools import chain
-import hashlib
-from io import StringIO, TextIOWrapper
-from pathlib import Path
-import shutil
+"""Plugin entry point for the freeze-wheel command.
+
+This is imported on every poetry invocation, so it sticks to what's
+needed to register the command. The freezing machinery in
+poetry_plugin_freeze.freeze is only imported once the command runs.
+"""
+
+from collections import deque
+from functools import partial
 import os
-import tempfile
-import zipfile
+from pathlib import Path
 
 from cleo.helpers import option
 from poetry.console.commands.command import Command
-from poetry.core.packages.dependency_group import MAIN_GROUP
-from poetry.core.version.markers import MultiMarker, SingleMarker
-from poetry.packages import DependencyPackage
-from poetry.utils.env import EnvManager
-from poetry.core.masonry.metadata import Metadata
-from poetry.core.masonry.utils.helpers import distribution_name
-from poetry.core.version.markers import union as marker_union
-from poetry.factory import Factory
 from poetry.plugins.application_plugin import ApplicationPlugin
-from poetry.core.packages.utils.utils import create_nested_marker
-from poetry.core.version.markers import parse_marker, BaseMarker
-from poetry.core.constraints.version import VersionConstraint
 
-from poetry_plugin_export.walker import get_project_dependency_packages, walk_dependencies
+from poetry_plugin_freeze.discovery import ProjectFinder, explicit_projects
 
 try:
     from poetry.core.pyproject.exceptions import PyProjectError
@@ -48,322 +36,627 @@ class FreezeCommand(Command):
             value_required=False,
             multiple=True,
         ),
+        option(
+            "in-place",
+            None,
+            "Patch wheels in place, only rewriting their metadata entries where possible"
+            " (an interrupted patch can leave a damaged wheel)",
+            flag=True,
+        ),
+        option(
+            "output-dir",
+            None,
+            "Write frozen wheels to this directory, leaving the built wheels as they are",
+            flag=False,
+        ),
+        option(
+            "incremental",
+            None,
+            "Skip wheels whose metadata already holds the frozen requirements",
+            flag=True,
+        ),
+        option(
+            "manifest",
+            None,
+            "Write the sha256 and blake2 digests of frozen wheels to SHA256SUMS and"
+            " manifest.json files next to them, computed as the wheels are written",
+            flag=True,
+        ),
+        option(
+            "check",
+            None,
+            "Check that wheels are frozen and match the lock files without writing them,"
+            " failing on any drift",
+            flag=True,
+        ),
+        option(
+            "emit-plan",
+            None,
+            "Write the frozen requirements of each project to this plan file"
+            " instead of freezing wheels",
+            flag=False,
+        ),
+        option(
+            "apply-plan",
+            None,
+            "Freeze wheels from a plan file written by --emit-plan, without"
+            " resolving the projects",
+            flag=False,
+        ),
+        option("timings", None, "Print the time taken by each phase and project", flag=True),
+        option(
+            "report",
+            None,
+            "Write per phase, project and wheel timings and wheel sizes to this json file",
+            flag=False,
+        ),
+        option(
+            "profile",
+            None,
+            "Dump cProfile stats of the run to this file, worker processes aren't profiled",
+            flag=False,
+        ),
+        option(
+            "cache-dir",
+            None,
+            "Directory to cache freeze plans in, defaults to a freeze-plans directory"
+            " in the poetry cache",
+            flag=False,
+        ),
+        option(
+            "projects",
+            None,
+            "A project directory or glob to freeze, skipping discovery",
+            flag=False,
+            value_required=False,
+            multiple=True,
+        ),
+        option(
+            "include-path",
+            None,
+            "Only freeze projects whose directory matches this glob",
+            flag=False,
+            value_required=False,
+            multiple=True,
+        ),
+        option(
+            "exclude-path",
+            None,
+            "Skip directories matching this glob when discovering projects",
+            flag=False,
+            value_required=False,
+            multiple=True,
+        ),
+        option(
+            "max-depth",
+            None,
+            "Maximum directory depth to discover projects at",
+            flag=False,
+        ),
+        option("gitignore", None, "Skip directories ignored by .gitignore files", flag=True),
+        option(
+            "changed-since",
+            None,
+            "Only freeze projects changed since this git ref, along with their dependents",
+            flag=False,
+        ),
+        option(
+            "jobs",
+            short_name="-j",
+            description="Number of worker processes to load and freeze projects with",
+            flag=False,
+            default="1",
+        ),
     ]
 
-    def project_roots(self, root):
-        env = EnvManager(self.poetry).get()
-
-        excludes = []
-        if env.is_venv():
-            excludes.append(env.path)
-
-        return project_roots(root, *excludes)
-
-    def handle(self) -> int:
-        self.line("freezing wheels")
-        root_dir = self._io and self._io.input.option("directory") or Path.cwd()
-
-        fridge = {}
-        for project_root in self.project_roots(root_dir):
-            try:
-                iced = IcedPoet(project_root, self.option("wheel-dir"), self.option("exclude"))
-                iced.check()
-                fridge[iced.name] = iced
-            except (PyProjectError, RuntimeError) as err:
-                self.line_error(f"skipping {project_root}: {err}")
-
-        for iced in fridge.values():
-            iced.set_fridge(fridge)
-            for w in iced.freeze():
-                self.line(f"froze {iced.name} {iced.version} -> {w}")
-
-        return 0
-
+    def discover(self, root):
+        """The project roots to freeze, and whether a directory may be one of them."""
+        config = get_freeze_config(root)
+
+        projects = self.option("projects") or config.get("projects")
+        if projects:
+            found = {p.resolve() for p in explicit_projects(root, projects)}
+            return explicit_projects(root, projects), lambda path: Path(path).resolve() in found
+
+        max_depth = self.option("max-depth") or config.get("max-depth")
+        finder = ProjectFinder(
+            root,
+            include=self.option("include-path") or config.get("include-paths", ()),
+            exclude=self.option("exclude-path") or config.get("exclude-paths", ()),
+            max_depth=max_depth if max_depth is None else int(max_depth),
+            gitignore=self.option("gitignore") or config.get("gitignore", False),
+        )
+        return iter(finder), finder.may_find
 
-def factory():
-    return FreezeCommand()
+    def get_plan_cache(self):
+        # poetry's global --no-cache option also bypasses the plan cache
+        if self.option("no-cache"):
+            return None
 
+        from poetry_plugin_freeze.cache import PlanCache
 
-def get_python_marker_from_constraint(constraint: VersionConstraint) -> BaseMarker:
-    return parse_marker(create_nested_marker("python_version", constraint))
+        cache_dir = self.option("cache-dir")
+        if not cache_dir:
+            from poetry.config.config import Config
 
+            cache_dir = Path(Config.create().get("cache-dir")) / "freeze-plans"
+        return PlanCache(cache_dir)
 
-class FreezeApplicationPlugin(ApplicationPlugin):
-    def activate(self, application):
-        application.command_loader.register_factory("freeze-wheel", factory)
+    def handle(self) -> int:
+        profile = self.option("profile")
+        if not profile:
+            return self.handle_freeze()
 
+        import cProfile
 
-def config_path_excluded(config_path, *excludes):
-    for exclude in excludes:
-        if str(config_path).startswith(str(exclude)):
-            return True
-    return False
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(self.handle_freeze)
+        finally:
+            profiler.dump_stats(profile)
 
+    def handle_freeze(self):
+        from poetry_plugin_freeze.timings import Timings
 
-def project_roots(root, *excludes):
-    for config_path in Path(root).rglob("pyproject.toml"):
-        if not config_path_excluded(config_path, *excludes):
-            yield config_path.parent
+        self.line("freezing wheels")
+        root_dir = self._io and self._io.input.option("directory") or Path.cwd()
 
+        try:
+            jobs = int(self.option("jobs"))
+        except ValueError:
+            jobs = 0
+        if jobs < 1:
+            self.line_error(f"invalid --jobs value: {self.option('jobs')}")
+            return 1
+
+        self.timings = Timings(enabled=bool(self.option("timings") or self.option("report")))
+        self.wheel_digests = []
+        self.discoverable = None
+        self.output_dir = self.option("output-dir")
+        if self.output_dir:
+            self.output_dir = os.path.abspath(self.output_dir)
+            if not (self.option("check") or self.option("emit-plan")):
+                os.makedirs(self.output_dir, exist_ok=True)
+        status = self.dispatch(root_dir, jobs)
+
+        if self.option("timings"):
+            for line in self.timings.format_lines():
+                self.line(line)
+        if self.option("report"):
+            self.timings.write_report(self.option("report"))
+        return status
+
+    def dispatch(self, root_dir, jobs):
+        if self.option("apply-plan"):
+            if self.option("check"):
+                return self.check_plan(root_dir, self.option("apply-plan"))
+            return self.apply_plan(root_dir, self.option("apply-plan"))
+
+        # discovery is consumed lazily, so projects start loading and
+        # freezing while the rest of the tree is still being walked.
+        project_roots, self.discoverable = self.discover(root_dir)
+        project_roots = self.timings.iterate("discover", project_roots)
+        if self.option("changed-since"):
+            from poetry_plugin_freeze.changes import ChangeSet
 
-def get_sha256_digest(content: bytes):
-    hashsum = hashlib.sha256()
-    hashsum.update(content)
-    hash_digest = urlsafe_b64encode(hashsum.digest()).decode("ascii").rstrip("=")
-    return hash_digest
+            try:
+                changes = ChangeSet(
+                    root_dir,
+                    self.option("changed-since"),
+                    wheel_dir=self.option("wheel-dir"),
+                    output_dir=self.output_dir,
+                )
+            except RuntimeError as err:
+                self.line_error(f"--changed-since: {err}")
+                return 1
+            project_roots = changes.filter(project_roots)
+            discoverable = self.discoverable
+            self.discoverable = lambda path: discoverable(path) and changes.affects(path)
+        if self.option("emit-plan"):
+            return self.emit_plan(root_dir, project_roots, jobs, self.option("emit-plan"))
+        if self.option("check"):
+            return self.check_projects(project_roots, jobs)
+        if jobs > 1:
+            return self.freeze_parallel(project_roots, jobs)
+        return self.freeze_serial(project_roots)
+
+    def new_fridge(self):
+        from poetry_plugin_freeze.freeze import Fridge, IcedPoet
+
+        return Fridge(
+            claimable=self.discoverable,
+            loader=partial(
+                IcedPoet,
+                wheel_dir=self.option("wheel-dir"),
+                exclude_packages=self.option("exclude"),
+                in_place=self.option("in-place"),
+                plan_cache=self.get_plan_cache(),
+                incremental=self.option("incremental"),
+                output_dir=self.output_dir,
+            ),
+        )
 
+    def load_projects(self, fridge, project_roots, counts):
+        """Load each project as it's discovered, yielding those that can be frozen.
 
-class IcedPoet:
-    factory = Factory()
+        A project only needs its own path dependencies loaded before it
+        is planned, the fridge loads those on demand, so each project is
+        yielded without waiting on any of the others. Projects whose lock
+        is missing or stale count as failed in counts.
+        """
+        from poetry_plugin_freeze.freeze import LockError
 
-    def __init__(self, project_dir, wheel_dir="dist", exclude_packages=()):
-        self.project_dir = project_dir
-        self.wheel_dir = wheel_dir
-        self.poetry = self.factory.create_poetry(project_dir)
-        self.meta = Metadata.from_package(self.poetry.package)
-        self.fridge = None
-        self.exclude_packages = exclude_packages
+        for project_root in project_roots:
+            try:
+                with self.timings.phase("load") as load:
+                    iced = fridge.load(project_root)
+                    load.project = iced.name
+            except (PyProjectError, RuntimeError) as err:
+                self.line_error(f"skipping {project_root}: {err}")
+                continue
+            except LockError as err:
+                counts["failed"] += 1
+                self.line_error(f"failed to load {project_root}: {err!r}")
+                continue
+            iced.set_fridge(fridge)
+            yield iced
+        # nothing is left to claim the path dependencies loaded on demand
+        fridge.release()
 
-    def set_fridge(self, fridge):
-        self.fridge = fridge
+    def freeze_serial(self, project_roots):
+        from poetry_plugin_freeze.plan import output_path
 
-    def check(self):
-        assert self.poetry.locker.is_locked() is True
-        assert self.poetry.locker.is_fresh() is True
+        fridge = self.new_fridge()
+        counts = {"frozen": 0, "skipped": 0, "failed": 0}
+        for iced in self.load_projects(fridge, project_roots, counts):
+            try:
+                wheels = list(iced.get_wheels())
+                if not wheels:
+                    continue
+                with self.timings.phase("plan", iced.name):
+                    plan = iced.get_freeze_plan()
+                for w in wheels:
+                    digests = {} if self.option("manifest") else None
+                    target = output_path(w, self.output_dir)
+                    written = self.timings.freeze_wheel(
+                        iced.name, w, iced.freeze_wheel, plan, digests, output_path=target
+                    )
+                    self.report_wheel(counts, iced.name, iced.version, target, written, digests)
+            except Exception as err:
+                counts["failed"] += 1
+                self.line_error(f"failed to freeze {iced.project_dir}: {err!r}")
+
+        return self.report_counts(counts)
+
+    def emit_plan(self, root_dir, project_roots, jobs, plan_file):
+        """Plan every project and write the plans to a plan file for --apply-plan."""
+        from poetry_plugin_freeze.plan import write_plan_file
+
+        projects = []
+        failed = 0
+        if jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            from poetry_plugin_freeze.freeze import resolve_project_plan
+            from poetry_plugin_freeze.timings import run_timed
+
+            plan_cache = self.get_plan_cache()
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    (
+                        project_root,
+                        pool.submit(
+                            run_timed,
+                            resolve_project_plan,
+                            self.timings.enabled,
+                            project_root,
+                            self.option("exclude"),
+                            plan_cache,
+                        ),
+                    )
+                    for project_root in project_roots
+                ]
+                for project_root, future in futures:
+                    try:
+                        plan, timings = future.result()
+                    except (PyProjectError, RuntimeError) as err:
+                        self.line_error(f"skipping {project_root}: {err}")
+                    except Exception as err:
+                        failed += 1
+                        self.line_error(f"failed to plan {project_root}: {err!r}")
+                    else:
+                        self.timings.merge(timings)
+                        projects.append((project_root, plan))
+        else:
+            fridge = self.new_fridge()
+            counts = {"failed": 0}
+            for iced in self.load_projects(fridge, project_roots, counts):
+                try:
+                    with self.timings.phase("plan", iced.name):
+                        projects.append((iced.project_dir, iced.get_freeze_plan()))
+                except Exception as err:
+                    failed += 1
+                    self.line_error(f"failed to plan {iced.project_dir}: {err!r}")
+            failed += counts["failed"]
+
+        if failed:
+            self.line_error(f"{failed} project(s) failed to plan, not writing {plan_file}")
+            return 1
+        for _, plan in projects:
+            self.line(f"planned {plan.name} {plan.version}")
+        write_plan_file(
+            plan_file,
+            [(os.path.relpath(project_root, root_dir), plan) for project_root, plan in projects],
+        )
+        self.line(f"wrote {len(projects)} plan(s) to {plan_file}")
+        return 0
 
-    @property
-    def name(self):
-        return self.poetry.package.name
+    def apply_plan(self, root_dir, plan_file):
+        """Freeze wheels from a plan file, without loading any of the projects."""
+        from poetry_plugin_freeze.apply import apply_plan_file
+
+        counts = {"frozen": 0, "skipped": 0, "failed": 0}
+        try:
+            for plan, w, written, digests in apply_plan_file(
+                plan_file,
+                root=root_dir,
+                wheel_dir=self.option("wheel-dir"),
+                timings=self.timings,
+                digest=self.option("manifest"),
+                in_place=self.option("in-place"),
+                incremental=self.option("incremental"),
+                output_dir=self.output_dir,
+            ):
+                self.report_wheel(counts, plan.name, plan.version, w, written, digests)
+        except Exception as err:
+            counts["failed"] += 1
+            self.line_error(f"failed to apply {plan_file}: {err!r}")
+        return self.report_counts(counts)
+
+    def check_projects(self, project_roots, jobs):
+        """Plan every project and check its wheels against the plan, writing none."""
+        counts = {"ok": 0, "drifted": 0, "failed": 0}
+        if jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            from poetry_plugin_freeze.freeze import plan_project
+            from poetry_plugin_freeze.timings import run_timed
+
+            plan_cache = self.get_plan_cache()
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    (
+                        project_root,
+                        pool.submit(
+                            run_timed,
+                            plan_project,
+                            self.timings.enabled,
+                            project_root,
+                            self.option("wheel-dir"),
+                            self.option("exclude"),
+                            plan_cache,
+                        ),
+                    )
+                    for project_root in project_roots
+                ]
+                for project_root, future in futures:
+                    try:
+                        (plan, wheels), timings = future.result()
+                    except (PyProjectError, RuntimeError) as err:
+                        self.line_error(f"skipping {project_root}: {err}")
+                        continue
+                    except Exception as err:
+                        counts["failed"] += 1
+                        self.line_error(f"failed to check {project_root}: {err!r}")
+                        continue
+                    self.timings.merge(timings)
+                    self.check_wheels(counts, project_root, plan, wheels)
+        else:
+            fridge = self.new_fridge()
+            for iced in self.load_projects(fridge, project_roots, counts):
+                try:
+                    wheels = list(iced.get_wheels())
+                    if not wheels:
+                        continue
+                    with self.timings.phase("plan", iced.name):
+                        plan = iced.get_freeze_plan()
+                except Exception as err:
+                    counts["failed"] += 1
+                    self.line_error(f"failed to check {iced.project_dir}: {err!r}")
+                    continue
+                self.check_wheels(counts, iced.project_dir, plan, wheels)
 
-    @property
-    def distro_name(self):
-        return distribution_name(self.name)
+        return self.report_check_counts(counts)
 
-    @property
-    def version(self):
-        return self.poetry.package.version
+    def check_wheels(self, counts, project_root, plan, wheels):
+        from poetry_plugin_freeze.plan import check_wheel
 
-    def get_wheels(self):
-        dist_dir = self.project_dir / self.wheel_dir
-        wheels = list(dist_dir.glob("*whl"))
-        prefix = "%s-%s" % (self.distro_name, self.meta.version)
         for w in wheels:
-            if not w.name.startswith(prefix):
+            try:
+                with self.timings.phase("check", plan.name):
+                    target, problems = check_wheel(plan, w, self.output_dir)
+            except Exception as err:
+                counts["failed"] += 1
+                self.line_error(f"failed to check {w}: {err!r}")
                 continue
-            yield w
-
-    def freeze(self):
-        wheels = list(self.get_wheels())
-        if not wheels:
-            return []
-        dep_packages = self.get_dep_packages()
-        for w in wheels:
-            self.freeze_wheel(w, dep_packages)
-        return wheels
-
-    def get_dep_packages(self):
-        root_package = self.poetry.package.with_dependency_groups([MAIN_GROUP], only=True)
-
-        return list(
-            get_project_dependency_packages(
-                self.poetry.locker,
-                project_requires=root_package.all_requires,
-                root_package_name=root_package.name,
-                project_python_marker=get_python_marker_from_constraint(
-                    root_package.python_constraint
-                ),
-                extras=root_package.extras,
-            )
-        )
-
-    @lru_cache(maxsize=None)
-    def get_dependency_sources(self):
-        """Determine the root source of each locked dependency
-
-        For each locked dependency, determine whether it came
-        as a base requirement or part of one or more extras.
+            self.report_check(counts, plan.name, plan.version, target, problems)
+
+    def check_plan(self, root_dir, plan_file):
+        """Check wheels against a plan file, without loading any of the projects."""
+        from poetry_plugin_freeze.apply import check_plan_file
+
+        counts = {"ok": 0, "drifted": 0, "failed": 0}
+        try:
+            for plan, w, problems in check_plan_file(
+                plan_file,
+                root=root_dir,
+                wheel_dir=self.option("wheel-dir"),
+                timings=self.timings,
+                output_dir=self.output_dir,
+            ):
+                self.report_check(counts, plan.name, plan.version, w, problems)
+        except Exception as err:
+            counts["failed"] += 1
+            self.line_error(f"failed to check {plan_file}: {err!r}")
+        return self.report_check_counts(counts)
+
+    def report_check(self, counts, name, version, wheel, problems):
+        if problems:
+            counts["drifted"] += 1
+            self.line(f"drifted {name} {version} -> {wheel}")
+            for problem in problems:
+                self.line(f"  {problem}")
+        else:
+            counts["ok"] += 1
+            self.line(f"ok {name} {version} -> {wheel}")
+
+    def report_check_counts(self, counts):
+        self.line("{ok} ok, {drifted} drifted, {failed} failed".format(**counts))
+        return 1 if counts["drifted"] or counts["failed"] else 0
+
+    def report_wheel(self, counts, name, version, wheel, written, digests=None):
+        if digests is not None:
+            self.wheel_digests.append((wheel, digests))
+        if written:
+            counts["frozen"] += 1
+            self.line(f"froze {name} {version} -> {wheel}")
+        else:
+            counts["skipped"] += 1
+            self.line(f"skipped {name} {version} -> {wheel} (already frozen)")
+
+    def report_counts(self, counts):
+        if self.option("manifest"):
+            from poetry_plugin_freeze.manifest import write_manifests
+
+            for path in write_manifests(self.wheel_digests):
+                self.line(f"wrote {path}")
+        self.line("{frozen} frozen, {skipped} skipped, {failed} failed".format(**counts))
+        return 1 if counts["failed"] else 0
+
+    def freeze_parallel(self, project_roots, jobs):
+        """Load and freeze projects in a pool of worker processes.
+
+        Projects are submitted as they're discovered and each is loaded
+        and planned in a worker, its wheels are submitted as separate
+        tasks as soon as its plan is in, whichever project finishes
+        planning first. At most a few projects per worker are in flight,
+        so discovery never runs far ahead of the pool.
+
+        Results are reported in discovery order regardless of which
+        worker finishes first, failures are collected per project.
         """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        from poetry_plugin_freeze.freeze import plan_project
+        from poetry_plugin_freeze.plan import freeze_wheel
+        from poetry_plugin_freeze.timings import run_timed
+
+        plan_cache = self.get_plan_cache()
+        enabled = self.timings.enabled
+        counts = {"frozen": 0, "skipped": 0, "failed": 0}
+        project_roots = iter(project_roots)
+        # projects in flight in discovery order, as
+        # [project root, plan future, plan, wheel futures]
+        in_flight = deque()
+        max_in_flight = 2 * jobs
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            discovering = True
+            while discovering or in_flight:
+                while discovering and len(in_flight) < max_in_flight:
+                    project_root = next(project_roots, None)
+                    if project_root is None:
+                        discovering = False
+                        break
+                    future = pool.submit(
+                        run_timed,
+                        plan_project,
+                        enabled,
+                        project_root,
+                        self.option("wheel-dir"),
+                        self.option("exclude"),
+                        plan_cache,
+                    )
+                    in_flight.append([project_root, future, None, None])
+
+                pending = [f for entry in in_flight for f in [entry[1]] + (entry[3] or [])]
+                wait([f for f in pending if not f.done()], return_when=FIRST_COMPLETED)
+
+                for entry in in_flight:
+                    project_root, future, _, wheel_futures = entry
+                    if wheel_futures is not None or not future.done():
+                        continue
+                    entry[3] = []
+                    try:
+                        (plan, wheels), timings = future.result()
+                    except (PyProjectError, RuntimeError) as err:
+                        self.line_error(f"skipping {project_root}: {err}")
+                        continue
+                    except Exception as err:
+                        counts["failed"] += 1
+                        self.line_error(f"failed to freeze {project_root}: {err!r}")
+                        continue
+                    self.timings.merge(timings)
+                    entry[2] = plan
+                    entry[3] = [
+                        pool.submit(
+                            run_timed,
+                            freeze_wheel,
+                            enabled,
+                            plan,
+                            w,
+                            self.option("in-place"),
+                            self.option("incremental"),
+                            self.option("manifest"),
+                            self.output_dir,
+                        )
+                        for w in wheels
+                    ]
+
+                # report finished projects, in discovery order
+                while in_flight and in_flight[0][3] is not None:
+                    if not all(f.done() for f in in_flight[0][3]):
+                        break
+                    project_root, _, plan, wheel_futures = in_flight.popleft()
+                    for future in wheel_futures:
+                        try:
+                            (w, written, digests), timings = future.result()
+                        except Exception as err:
+                            counts["failed"] += 1
+                            self.line_error(f"failed to freeze {project_root}: {err!r}")
+                            continue
+                        self.timings.merge(timings)
+                        self.report_wheel(counts, plan.name, plan.version, w, written, digests)
+
+        return self.report_counts(counts)
 
-        def _with_python_marker(requirements, root_package):
-            """Augment requirements with the root package's python marker"""
-            marked_requirements = []
-            for require in requirements:
-                require = require.clone()
-                require.marker = require.marker.intersect(
-                    get_python_marker_from_constraint(root_package.python_constraint),
-                )
-                marked_requirements.append(require)
-            return marked_requirements
-
-        repository = self.poetry.locker.locked_repository()
-        root_package = self.poetry.package
-        locked_packages_by_name = {}
-        for pkg in repository.packages:
-            locked_packages_by_name.setdefault(pkg.name, []).append(pkg)
-        dependency_sources = {}
-        base_requires = [
-            dep
-            for dep in root_package.requires
-            if not dep.is_optional() or set(dep.in_extras) <= root_package.features
-        ]
-
-        # Identify nested dependencies that don't require extra selections.
-        base_nested_dependencies = walk_dependencies(
-            _with_python_marker(base_requires, root_package),
-            packages_by_name=locked_packages_by_name,
-            root_package_name=root_package.name,
-        )
-        for d in base_nested_dependencies:
-            dependency_sources.setdefault(d.name, set()).add("base")
-
-        # Identify nested dependencies that come from one or more extra
-        # selections.
-        for extra in root_package.extras:
-            extra_nested_dependencies = walk_dependencies(
-                _with_python_marker(root_package.extras[extra], root_package),
-                packages_by_name=locked_packages_by_name,
-                root_package_name=root_package.name,
-            )
-            for d in extra_nested_dependencies:
-                dependency_sources.setdefault(d.name, set()).add(extra)
-        return dependency_sources
-
-    def compact_markers(self, dependency):
-        """Update a dependency to consolidate its markers.
-
-        This avoids duplication when there are multiple markers
-        (for sets of python versions, for example). It also records
-        extra dependency markers which are lost in the conversion
-        from installed package to dependency.
-        """
-        dep_sources = self.get_dependency_sources().get(dependency.name, set())
-
-        # Record extra markers only if a dependency is not included
-        # in the base requirement set.
-        new_marker = dependency.marker.without_extras()
-        in_base = "base" in dep_sources
-        in_extras = dep_sources - {"base"}
-        if in_extras and not in_base:
-            extra_markers = marker_union(*(SingleMarker("extra", extra) for extra in in_extras))
-            new_marker = MultiMarker(new_marker, extra_markers)
-        dependency.marker = new_marker
-
-    def get_frozen_deps(self, dep_packages, exclude_packages=None):
-        lines = []
-        dependency_sources = self.get_dependency_sources()
-        for dep_package in dep_packages:
-            self.compact_markers(dep_package.dependency)
-            # Freeze extra markers for dependencies which were pulled in via extras
-            # Don't freeze markers if a dependency is also part of the base
-            # dependency tree.
-            freeze_extras = "base" not in dependency_sources.get(dep_package.dependency.name, set())
-            requirement = dep_package.dependency.to_pep_508(with_extras=freeze_extras)
-
-            if dep_package.package.name in exclude_packages:
-                lines.append(requirement)
-                continue
 
-            require_dist = "%s (==%s)" % (dep_package.package.name, dep_package.package.version)
-            if ";" in requirement:
-                markers = requirement.split(";", 1)[1].strip()
-                require_dist += f" ; {markers}"
-            lines.append(require_dist)
-        return lines
+def factory():
+    return FreezeCommand()
 
-    def replace_deps(self, dist_meta, dep_lines):
-        start_pos = 0
 
-        for m in dist_meta.get_all("Requires-Dist", ()):
-            if not start_pos:
-                start_pos = dist_meta._headers.index(("Requires-Dist", m))
-            dist_meta._headers.remove(("Requires-Dist", m))
+class FreezeApplicationPlugin(ApplicationPlugin):
+    def activate(self, application):
+        application.command_loader.register_factory("freeze-wheel", factory)
 
-        for idx, h in enumerate(dep_lines):
-            dist_meta._headers.insert(start_pos + idx, ("Requires-Dist", h))
 
-        return dist_meta
+def project_roots(root, *excludes, **options):
+    return iter(ProjectFinder(root, excludes, **options))
 
-    def get_path_deps(self, group="dev"):
-        # assuming we're consistent install across deps.
-        group = self.poetry.package.dependency_group(group)
-        for dep in group.dependencies:
-            if not (dep.is_file() or dep.is_directory()):
-                continue
-            if dep.is_vcs() or dep.is_url():
-                continue
-            iced = IcedPoet(dep.full_path)
-            # Carry markers from the root package dependency through to the iced package
-            self.compact_markers(dep)
-            iced_dep = iced.poetry.package.to_dependency()
-            iced_dep.marker = MultiMarker(dep.marker, iced_dep.marker)
-            package_dep = DependencyPackage(dependency=iced_dep, package=iced.poetry.package)
-            yield package_dep
-
-    def freeze_record(self, records_fh, dist_meta, md_path):
-        hash_digest = get_sha256_digest(str(dist_meta).encode("utf8"))
-        output = StringIO()
-        csv_params = {
-            "delimiter": csv.excel.delimiter,
-            "quotechar": csv.excel.quotechar,
-            "lineterminator": "\n",
-        }
-        writer = csv.writer(output, **csv_params)
-        reader = csv.reader(TextIOWrapper(records_fh, encoding="utf8"), **csv_params)
-
-        for row in reader:
-            if row[0] == md_path:
-                continue
-            writer.writerow(row)
 
-        writer.writerow((md_path, f"sha256={hash_digest}", len(str(dist_meta).encode("utf8"))))
-        return output.getvalue()
+def get_freeze_config(root_dir):
+    """Read the [tool.freeze] table from the root pyproject, if any."""
+    from poetry.core.pyproject.toml import PyProjectTOML
+
+    data = PyProjectTOML(Path(root_dir) / "pyproject.toml").data
+    return data.get("tool", {}).get("freeze", {})
 
-    def freeze_wheel(self, wheel_path, dep_packages):
-        dist_info = "%s-%s.dist-info" % (
-            self.distro_name,
-            self.meta.version,
-        )
-        md_path = f"{dist_info}/METADATA"
-        record_path = f"{dist_info}/RECORD"
-
-        with zipfile.ZipFile(wheel_path) as source_whl:
-            # freeze deps in metadata and update records
-            md_text = source_whl.open(md_path).read().decode("utf8")
-            dist_meta = Parser().parsestr(md_text)
-            path_deps = self.get_path_deps(MAIN_GROUP)
-            dep_lines = self.get_frozen_deps(chain(path_deps, dep_packages), self.exclude_packages)
-            if dep_lines:
-                self.replace_deps(dist_meta, dep_lines)
-
-            with source_whl.open(record_path) as record_fh:
-                record_text = self.freeze_record(record_fh, dist_meta, md_path)
-
-            (fd, temp_path) = tempfile.mkstemp(suffix=".whl")
-            with (
-                os.fdopen(fd, "w+b") as fd_file,
-                zipfile.ZipFile(fd_file, mode="w", compression=zipfile.ZIP_DEFLATED) as frozen_whl,
-            ):
-                # first copy all files to frozen zip
-                for info in source_whl.infolist():
-                    if info.filename in (md_path, record_path):
-                        sample = info
-                        continue
-                    info_fh = source_whl.open(info)
-                    frozen_whl.writestr(info, info_fh.read(), compress_type=zipfile.ZIP_DEFLATED)
-
-                # finally add in our modified files
-                date_time = (2016, 1, 1, 0, 0, 0)
-
-                md_info = zipfile.ZipInfo(md_path, date_time)
-                md_info.external_attr = sample.external_attr
-                frozen_whl.writestr(
-                    md_info,
-                    str(dist_meta).encode("utf8"),
-                    compress_type=zipfile.ZIP_DEFLATED,
-                )
 
-                record_info = zipfile.ZipInfo(record_path, date_time)
-                record_info.external_attr = sample.external_attr
-                frozen_whl.writestr(record_path, record_text, compress_type=zipfile.ZIP_DEFLATED)
+def __getattr__(name):
+    # IcedPoet and friends used to live here, load them on first access
+    # rather than at plugin import time.
+    if name in ("IcedPoet", "get_sha256_digest"):
+        from poetry_plugin_freeze import freeze
 
-        shutil.move(temp_path, str(wheel_path))
+        return getattr(freeze, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
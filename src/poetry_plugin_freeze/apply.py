@@ -0,0 +1,171 @@
+"""Apply an emitted freeze plan to wheels, without poetry.
+
+Plans written by ``poetry freeze-wheel --emit-plan`` hold the frozen
+requirements of each project, so wheel build jobs can freeze their
+wheels with just the standard library::
+
+    poetry-freeze-apply plan.json
+    poetry-freeze-apply plan.json wheelhouse/ dist/app-1.0-py3-none-any.whl
+    poetry-freeze-apply --manifest plan.json wheelhouse/
+    poetry-freeze-apply --output-dir frozen/ plan.json wheelhouse/
+    poetry-freeze-apply --check plan.json wheelhouse/
+
+With no wheels given, each project's wheel directory is searched.
+"""
+
+import argparse
+from functools import partial
+import os
+from pathlib import Path
+import sys
+
+from poetry_plugin_freeze.manifest import write_manifests
+from poetry_plugin_freeze.plan import check_wheel, output_path, read_plan_file
+
+
+def find_plan_wheels(projects, targets=(), root=".", wheel_dir="dist"):
+    """Match wheels to the plans of a plan file.
+
+    targets are wheel files or directories of wheels, by default the
+    wheel directory of each planned project below root. Yields (plan,
+    wheel path) pairs, wheels no plan matches are skipped.
+    """
+    if not targets:
+        for project_path, plan in projects:
+            for w in sorted((Path(root) / project_path / wheel_dir).glob("*.whl")):
+                if plan.matches_wheel(w):
+                    yield plan, w
+        return
+
+    for target in map(Path, targets):
+        wheels = sorted(target.glob("*.whl")) if target.is_dir() else [target]
+        for w in wheels:
+            for _, plan in projects:
+                if plan.matches_wheel(w):
+                    yield plan, w
+                    break
+
+
+def apply_plan_file(
+    plan_file, targets=(), root=".", wheel_dir="dist", timings=None, digest=False, **options
+):
+    """Freeze the wheels a plan file covers, yielding (plan, wheel, written, digests).
+
+    The wheel yielded is the frozen one, in the output_dir option if
+    given. digests are those of the frozen wheel with digest, else None.
+    options are passed on to FreezePlan.freeze_wheel.
+    """
+    projects = read_plan_file(plan_file)
+    for plan, w in find_plan_wheels(projects, targets, root, wheel_dir):
+        digests = {} if digest else None
+        freeze = partial(plan.freeze_wheel, digests=digests, **options)
+        target = output_path(w, options.get("output_dir"))
+        if timings is None:
+            yield plan, target, freeze(w), digests
+        else:
+            written = timings.freeze_wheel(plan.name, w, freeze, output_path=target)
+            yield plan, target, written, digests
+
+
+def check_plan_file(
+    plan_file, targets=(), root=".", wheel_dir="dist", timings=None, output_dir=None
+):
+    """Check the wheels a plan file covers are frozen, yielding (plan, wheel, problems).
+
+    With output_dir, the frozen copies in it are checked and yielded
+    instead. Nothing is written, see FreezePlan.check_wheel.
+    """
+    projects = read_plan_file(plan_file)
+    for plan, w in find_plan_wheels(projects, targets, root, wheel_dir):
+        if timings is None:
+            yield plan, *check_wheel(plan, w, output_dir)
+        else:
+            with timings.phase("check", plan.name):
+                target, problems = check_wheel(plan, w, output_dir)
+            yield plan, target, problems
+
+
+def check_main(args):
+    counts = {"ok": 0, "drifted": 0}
+    try:
+        for plan, w, problems in check_plan_file(
+            args.plan, args.wheels, args.root, args.wheel_dir, output_dir=args.output_dir
+        ):
+            if problems:
+                counts["drifted"] += 1
+                print(f"drifted {plan.name} {plan.version} -> {w}")
+                for problem in problems:
+                    print(f"  {problem}")
+            else:
+                counts["ok"] += 1
+                print(f"ok {plan.name} {plan.version} -> {w}")
+    except Exception as err:
+        print(f"failed to check {args.plan}: {err!r}", file=sys.stderr)
+        return 1
+    print("{ok} ok, {drifted} drifted".format(**counts))
+    return 1 if counts["drifted"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="poetry-freeze-apply", description="Freeze wheels from an emitted freeze plan."
+    )
+    parser.add_argument("plan", help="plan file written by poetry freeze-wheel --emit-plan")
+    parser.add_argument("wheels", nargs="*", help="wheel files or directories of wheels")
+    parser.add_argument("--root", default=".", help="directory the plan was emitted from")
+    parser.add_argument("--wheel-dir", default="dist", help="sub-directory containing wheels")
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="patch wheels in place, an interrupted patch can leave a damaged wheel",
+    )
+    parser.add_argument(
+        "--output-dir", help="write frozen wheels to this directory, leaving the wheels alone"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", help="skip wheels which are already frozen"
+    )
+    parser.add_argument(
+        "--manifest", action="store_true", help="write wheel digests next to the wheels"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="only check wheels are frozen, exit 1 if not"
+    )
+    args = parser.parse_args(argv)
+    if args.check:
+        return check_main(args)
+
+    counts = {"frozen": 0, "skipped": 0}
+    wheels = []
+    try:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        for plan, w, written, digests in apply_plan_file(
+            args.plan,
+            args.wheels,
+            args.root,
+            args.wheel_dir,
+            digest=args.manifest,
+            in_place=args.in_place,
+            incremental=args.incremental,
+            output_dir=args.output_dir,
+        ):
+            wheels.append((w, digests))
+            if written:
+                counts["frozen"] += 1
+                print(f"froze {plan.name} {plan.version} -> {w}")
+            else:
+                counts["skipped"] += 1
+                print(f"skipped {plan.name} {plan.version} -> {w} (already frozen)")
+        if args.manifest:
+            for path in write_manifests(wheels):
+                print(f"wrote {path}")
+    except Exception as err:
+        print(f"failed to apply {args.plan}: {err!r}", file=sys.stderr)
+        return 1
+    print("{frozen} frozen, {skipped} skipped".format(**counts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""A persistent cache of freeze plans.
+
+Plans are stored as small json files named by a key derived from the
+content of everything that goes into resolving them, so an unchanged
+project skips the dependency walk entirely on later runs. The cache
+is bounded by size, evicting the least recently used plans first.
+"""
+
+import json
+import os
+
+from poetry_plugin_freeze.plan import FreezePlan
+from poetry_plugin_freeze.wheel import atomic_output
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+
+
+class PlanCache:
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = str(directory)
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, encoding="utf8") as fh:
+                plan = FreezePlan.from_dict(json.load(fh))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        # bump the mtime, eviction goes by least recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return plan
+
+    def put(self, key, plan):
+        os.makedirs(self.directory, exist_ok=True)
+        # write then rename, so concurrent runs never see a partial entry
+        with atomic_output(self.path(key), encoding="utf8") as fh:
+            json.dump(plan.to_dict(), fh)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used plans until the cache fits max_size."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
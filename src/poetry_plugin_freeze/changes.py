@@ -0,0 +1,122 @@
+"""Select the projects affected by changes since a git ref, for --changed-since.
+
+A project is affected when a file below its directory changed, other
+than in a nested project, or when any of its path dependencies is,
+transitively. Changes come from local git: the diff of the working
+tree against the ref plus untracked files. Path dependencies are read
+from each pyproject directly, so deciding doesn't load any project.
+"""
+
+import os
+from pathlib import Path
+import subprocess
+
+from poetry.core.pyproject.toml import PyProjectTOML
+
+try:
+    from poetry.core.pyproject.exceptions import PyProjectError
+except ImportError:
+    # Account for the PyProjectException --> PyProjectError rename in Poetry 2.0
+    from poetry.core.pyproject.exceptions import PyProjectException as PyProjectError
+
+PROJECT_FILE = "pyproject.toml"
+
+
+def git(cwd, *args):
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, check=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError("git is not installed") from None
+    except subprocess.CalledProcessError as err:
+        raise RuntimeError(f"git {' '.join(args)} failed: {err.stderr.strip()}") from None
+    return result.stdout
+
+
+def git_changed_paths(top, ref):
+    """Absolute paths of files changed since ref, including untracked files."""
+    names = git(top, "diff", "--name-only", "-z", ref, "--").split("\0")
+    names += git(top, "ls-files", "--others", "--exclude-standard", "-z").split("\0")
+    return {resolve(top / name) for name in names if name}
+
+
+def read_path_deps(project_dir):
+    """Resolved directories of a project's main path dependencies."""
+    try:
+        data = PyProjectTOML(Path(project_dir) / PROJECT_FILE).data
+    except (OSError, PyProjectError):
+        return []
+    poetry = data.get("tool", {}).get("poetry", {})
+    groups = [
+        poetry.get("dependencies", {}),
+        poetry.get("group", {}).get("main", {}).get("dependencies", {}),
+    ]
+    deps = []
+    for group in groups:
+        for spec in group.values():
+            for constraint in spec if isinstance(spec, list) else [spec]:
+                if isinstance(constraint, dict) and "path" in constraint:
+                    deps.append(resolve(Path(project_dir) / constraint["path"]))
+    return deps
+
+
+def resolve(path):
+    # git reports the top level with symlinks resolved, so project dirs must be too
+    return Path(os.path.realpath(path))
+
+
+class ChangeSet:
+    """The changes since a git ref, answering which projects they affect.
+
+    Wheels built or frozen by the run itself aren't changes, files below
+    a project's wheel_dir and below output_dir are left out.
+    """
+
+    def __init__(self, root, ref, wheel_dir="dist", output_dir=None):
+        self.ref = ref
+        self.top = resolve(git(root, "rev-parse", "--show-toplevel").strip())
+        output_dir = output_dir and resolve(output_dir)
+        self.changed_dirs = {}
+        for path in git_changed_paths(self.top, ref):
+            if output_dir and path.is_relative_to(output_dir):
+                continue
+            project_dir = owning_project(path, self.top)
+            if project_dir is None or path.is_relative_to(resolve(project_dir / wheel_dir)):
+                continue
+            self.changed_dirs.setdefault(project_dir, []).append(path)
+        self._affected = {}
+
+    def affects(self, project_dir):
+        """Whether the project or any of its transitive path dependencies changed."""
+        project_dir = resolve(project_dir)
+        stack = [project_dir]
+        seen = set()
+        # depth first over the path dependency graph, guarding against cycles
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            known = self._affected.get(current)
+            if known or current in self.changed_dirs:
+                self._affected[project_dir] = True
+                return True
+            if known is False:
+                continue
+            stack.extend(read_path_deps(current))
+        self._affected[project_dir] = False
+        return False
+
+    def filter(self, project_roots):
+        for project_root in project_roots:
+            if self.affects(project_root):
+                yield project_root
+
+
+def owning_project(path, top):
+    """The innermost project directory containing path, up to top, if any."""
+    for parent in path.parents:
+        if (parent / PROJECT_FILE).is_file():
+            return parent
+        if parent == top:
+            break
+    return None
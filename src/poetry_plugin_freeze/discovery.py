@@ -0,0 +1,274 @@
+"""Project discovery for mono-repos.
+
+Walks the tree with os.scandir, pruning whole directories that can't
+contain projects we want (vcs metadata, tool caches, build output,
+virtualenvs, ignored paths) instead of visiting every file below them.
+"""
+
+from fnmatch import fnmatchcase
+import os
+from pathlib import Path
+import re
+
+PROJECT_FILE = "pyproject.toml"
+# entries marking a directory as a virtualenv or conda environment
+ENV_MARKERS = frozenset(("pyvenv.cfg", "conda-meta"))
+
+# directory names that never hold projects to freeze
+DENY_DIRS = frozenset(
+    (
+        ".git",
+        ".hg",
+        ".svn",
+        ".tox",
+        ".nox",
+        ".venv",
+        ".eggs",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        "__pycache__",
+        "node_modules",
+        "build",
+    )
+)
+
+
+def translate_gitignore(pattern):
+    """Translate a gitignore glob into a regex matching relative posix paths."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[%s]" % body.replace("\\", "\\\\"))
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+class GitIgnore:
+    """The rules of a single .gitignore file, relative to its directory."""
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, encoding="utf8") as fh:
+                lines = fh.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+        return cls.from_lines(lines)
+
+    @classmethod
+    def from_lines(cls, lines):
+        rules = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+            regex = translate_gitignore(line)
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            rules.append((re.compile(regex + "$"), negate, dir_only))
+        return cls(rules)
+
+    def match(self, rel_path, is_dir):
+        """Return True/False if a rule decides the path, None otherwise."""
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                result = not negate
+        return result
+
+
+class ProjectFinder:
+    """Find project directories below a root, pruning as it walks.
+
+    excludes are absolute paths which are skipped along with anything
+    below them. include and exclude are shell style globs matched
+    against directory paths relative to the root; excluded directories
+    are pruned, while include only filters which projects are reported.
+
+    Virtual environments, of any name, are recognized by their
+    pyvenv.cfg (or conda-meta) marker and skipped.
+    """
+
+    def __init__(
+        self,
+        root,
+        excludes=(),
+        include=(),
+        exclude=(),
+        max_depth=None,
+        gitignore=False,
+        deny_dirs=DENY_DIRS,
+        skip_venvs=True,
+    ):
+        self.root = Path(root)
+        self.excludes = {os.path.normpath(os.path.abspath(e)) for e in excludes}
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.max_depth = max_depth
+        self.gitignore = gitignore
+        self.deny_dirs = deny_dirs
+        self.skip_venvs = skip_venvs
+
+    def __iter__(self):
+        return self.walk()
+
+    def walk(self):
+        root = os.path.abspath(self.root)
+        if self.is_excluded(root, ""):
+            return
+        # stack of (directory path, relative posix path, depth, gitignore rules)
+        stack = [(root, "", 0, self.load_ignores(root, ""))]
+        while stack:
+            path, rel_path, depth, ignores = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+
+            if rel_path and self.skip_venvs and any(e.name in ENV_MARKERS for e in entries):
+                continue
+
+            subdirs = []
+            for entry in entries:
+                if entry.name == PROJECT_FILE and entry.is_file():
+                    if self.is_included(rel_path):
+                        yield self.root / rel_path if rel_path else self.root
+                elif entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry)
+
+            if self.max_depth is not None and depth >= self.max_depth:
+                continue
+
+            pending = []
+            for entry in subdirs:
+                if entry.name in self.deny_dirs:
+                    continue
+                child_rel = f"{rel_path}/{entry.name}" if rel_path else entry.name
+                if self.is_excluded(entry.path, child_rel):
+                    continue
+                if self.is_ignored(ignores, child_rel):
+                    continue
+                child_ignores = ignores + self.load_ignores(entry.path, child_rel)
+                pending.append((entry.path, child_rel, depth + 1, child_ignores))
+            # reversed so the stack pops directories in sorted order
+            stack.extend(reversed(pending))
+
+    def may_find(self, path):
+        """Whether walking may find a project at path, short of reading .gitignore files.
+
+        Virtual environments and ignored paths are only found out by
+        walking, a path they hide may still be reported as found.
+        """
+        rel_path = os.path.relpath(os.path.realpath(path), os.path.realpath(self.root))
+        if rel_path == os.curdir:
+            return self.is_included("")
+        if rel_path.startswith(os.pardir):
+            return False
+        parts = Path(rel_path).parts
+        if self.max_depth is not None and len(parts) > self.max_depth:
+            return False
+        root = os.path.abspath(self.root)
+        for depth in range(1, len(parts) + 1):
+            child_rel = "/".join(parts[:depth])
+            if parts[depth - 1] in self.deny_dirs:
+                return False
+            if self.is_excluded(os.path.join(root, *parts[:depth]), child_rel):
+                return False
+        return self.is_included("/".join(parts))
+
+    def is_excluded(self, path, rel_path):
+        if os.path.normpath(path) in self.excludes:
+            return True
+        return bool(rel_path) and any(fnmatchcase(rel_path, pattern) for pattern in self.exclude)
+
+    def is_included(self, rel_path):
+        if not self.include:
+            return True
+        rel_path = rel_path or "."
+        return any(fnmatchcase(rel_path, pattern) for pattern in self.include)
+
+    def load_ignores(self, path, rel_path):
+        if not self.gitignore:
+            return ()
+        ignore = GitIgnore.from_file(os.path.join(path, ".gitignore"))
+        if ignore is None:
+            return ()
+        return ((rel_path, ignore),)
+
+    @staticmethod
+    def is_ignored(ignores, rel_path):
+        # later (deeper) .gitignore files take precedence over their parents
+        for base, ignore in reversed(ignores):
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                sub_path = rel_path[len(base) + 1 :]
+            else:
+                sub_path = rel_path
+            result = ignore.match(sub_path, is_dir=True)
+            if result is not None:
+                return result
+        return False
+
+
+def explicit_projects(root, patterns):
+    """Resolve an explicit list of project paths or globs relative to root."""
+    root = Path(root)
+    seen = set()
+    for pattern in patterns:
+        if not any(c in pattern for c in "*?["):
+            candidates = [root / pattern]
+        else:
+            candidates = sorted(root.glob(pattern))
+        for candidate in candidates:
+            if candidate.name == PROJECT_FILE:
+                candidate = candidate.parent
+            if candidate in seen or not (candidate / PROJECT_FILE).is_file():
+                continue
+            seen.add(candidate)
+            yield candidate
@@ -0,0 +1,606 @@
+from collections import deque
+from functools import lru_cache
+import hashlib
+from importlib import metadata
+import json
+from itertools import chain
+from pathlib import Path
+from types import MappingProxyType
+
+from packaging.utils import canonicalize_name
+
+from poetry.core.packages.dependency_group import MAIN_GROUP
+from poetry.core.packages.package import Package
+from poetry.packages import DependencyPackage
+from poetry.utils.extras import get_extra_package_names
+from poetry.core.masonry.utils.helpers import distribution_name
+from poetry.core.version.markers import BaseMarker
+from poetry.core.constraints.version import VersionConstraint
+
+from poetry_plugin_export.walker import (
+    get_locked_package,
+    get_python_version_region_markers,
+)
+
+from poetry_plugin_freeze import markers
+from poetry_plugin_freeze.loader import ProjectFactory
+from poetry_plugin_freeze.plan import FreezePlan, get_sha256_digest  # noqa: F401
+from poetry_plugin_freeze.timings import Timings
+
+
+# bump when changes to resolving plans would produce different plans
+PLAN_CACHE_VERSION = "1"
+
+# the distributions whose code resolves plans, cached plans are keyed by their versions
+PLAN_DISTRIBUTIONS = ("poetry", "poetry-core", "poetry-plugin-export", "poetry-plugin-freeze")
+
+
+@lru_cache(maxsize=None)
+def plan_distribution_versions():
+    versions = []
+    for name in PLAN_DISTRIBUTIONS:
+        try:
+            versions.append(f"{name}=={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{name} missing")
+    return ",".join(versions)
+
+
+def plan_project(
+    project_root, wheel_dir="dist", exclude_packages=(), plan_cache=None, timings=None
+):
+    """Load a project and plan its freeze, the unit of work for --jobs project workers.
+
+    Returns the freeze plan and the wheels to apply it to, the plan is
+    None when the project has no wheels.
+    """
+    timings = timings or Timings(enabled=False)
+    with timings.phase("load") as load:
+        iced = IcedPoet(project_root, wheel_dir, exclude_packages, plan_cache=plan_cache)
+        iced.check()
+        load.project = iced.name
+    iced.set_fridge(Fridge([iced]))
+    wheels = list(iced.get_wheels())
+    if not wheels:
+        return None, []
+    with timings.phase("plan", iced.name):
+        return iced.get_freeze_plan(), wheels
+
+
+def resolve_project_plan(project_root, exclude_packages=(), plan_cache=None, timings=None):
+    """Load a project and plan its freeze, whether or not it has wheels built."""
+    timings = timings or Timings(enabled=False)
+    with timings.phase("load") as load:
+        iced = IcedPoet(project_root, exclude_packages=exclude_packages, plan_cache=plan_cache)
+        iced.check()
+        load.project = iced.name
+    iced.set_fridge(Fridge([iced]))
+    with timings.phase("plan", iced.name):
+        return iced.get_freeze_plan()
+
+
+def get_python_marker_from_constraint(constraint: VersionConstraint) -> BaseMarker:
+    return markers.python_marker(constraint)
+
+
+def walk_dependency_labels(roots, index, root_package_name):
+    """Label each locked package with the roots that reach it, in a single walk.
+
+    roots are (requirement, label) pairs, labels are int bitmasks. The
+    requirement graph is expanded once from all roots together, the same
+    way poetry_plugin_export.walker.walk_dependencies expands it, and
+    labels are then propagated over the recorded edges with cheap bitwise
+    operations, rather than walking the graph again for every root source.
+
+    Returns the label of each reached package name, along with the
+    requirement each locked package was reached as, which is what
+    walk_dependencies returns for the same roots.
+    """
+    labels = {}
+    edges = {}
+    names = {}
+    decided = {}
+
+    queue = deque()
+    for requirement, label in roots:
+        key = (requirement, requirement.marker)
+        labels[key] = labels.get(key, 0) | label
+        queue.append(requirement)
+
+    while queue:
+        requirement = queue.popleft()
+        key = (requirement, requirement.marker)
+        if key in edges:
+            continue
+        edges[key] = children = []
+        if requirement.name == root_package_name:
+            continue
+
+        locked_package = get_locked_package(requirement, index.packages_by_name, decided)
+        if not locked_package:
+            raise RuntimeError(f"Dependency walk failed at {requirement}")
+        if requirement.extras:
+            locked_package = locked_package.with_features(requirement.extras)
+        names[key] = locked_package.name
+
+        constraint = requirement.constraint
+        marker = requirement.marker
+        requirement = locked_package.to_dependency()
+        requirement.marker = markers.intersect(requirement.marker, marker)
+        requirement.constraint = constraint
+
+        for require in locked_package.requires:
+            if require.is_optional() and not any(
+                require in locked_package.extras.get(feature, ())
+                for feature in locked_package.features
+            ):
+                continue
+            base_marker = markers.without_extras(
+                markers.intersect(require.marker, requirement.marker)
+            )
+            if base_marker.is_empty():
+                continue
+            for region_marker in index.region_markers.get(require.name, ()):
+                marker = markers.intersect(region_marker, base_marker)
+                if not marker.is_empty():
+                    child = require.clone()
+                    child.marker = marker
+                    children.append((child, child.marker))
+                    queue.append(child)
+
+        if locked_package not in decided:
+            decided[locked_package] = requirement
+        else:
+            decided[locked_package].marker = decided[locked_package].marker.union(
+                requirement.marker
+            )
+
+    # propagate root labels along the recorded edges until nothing changes
+    pending = deque(labels)
+    while pending:
+        key = pending.popleft()
+        label = labels[key]
+        for child in edges.get(key, ()):
+            child_label = labels.get(child, 0)
+            if child_label | label != child_label:
+                labels[child] = child_label | label
+                pending.append(child)
+
+    package_labels = {}
+    for key, name in names.items():
+        package_labels[name] = package_labels.get(name, 0) | labels.get(key, 0)
+    return package_labels, decided
+
+
+class LockIndex:
+    """An index over a project's locked packages.
+
+    The lock is loaded into packages once and shared by every walk
+    over the project's dependencies. The index is treated as read only
+    once built.
+    """
+
+    def __init__(self, locker, python_constraint):
+        self._repository = locker.locked_repository()
+        self.packages = tuple(self._repository.packages)
+
+        by_name = {}
+        for pkg in self.packages:
+            by_name.setdefault(pkg.name, []).append(pkg)
+        # Put higher versions first so that we prefer them, as the export walker does.
+        self.packages_by_name = MappingProxyType(
+            {
+                name: tuple(sorted(pkgs, key=lambda p: p.version, reverse=True))
+                for name, pkgs in by_name.items()
+            }
+        )
+        # the python version regions each package's candidates split requirements into
+        self.region_markers = MappingProxyType(
+            {
+                name: tuple(get_python_version_region_markers(pkgs))
+                for name, pkgs in self.packages_by_name.items()
+            }
+        )
+        self.locked_extras = MappingProxyType(
+            {
+                canonicalize_name(extra): tuple(canonicalize_name(d) for d in dependencies)
+                for extra, dependencies in locker.lock_data.get("extras", {}).items()
+            }
+        )
+        self.python_marker = get_python_marker_from_constraint(python_constraint)
+
+    def find_package(self, dependency):
+        """Return the locked package satisfying a dependency, if any."""
+        packages = self._repository.find_packages(dependency=dependency)
+        return packages[0] if packages else None
+
+    def with_python_marker(self, requirements):
+        """Copy requirements, restricted to the project's python versions."""
+        marked_requirements = []
+        for require in requirements:
+            require = require.clone()
+            require.marker = markers.intersect(require.marker, self.python_marker)
+            marked_requirements.append(require)
+        return marked_requirements
+
+
+class ProjectSummary:
+    """What dependents need of a loaded project, kept in place of the project.
+
+    Holding these rather than projects lets a project's poetry objects
+    (its package graph, locker and lock index) be released as soon as it
+    is frozen, however many projects a run goes through.
+    """
+
+    __slots__ = ("name", "version", "distro_name", "project_dir", "python_versions")
+
+    def __init__(self, name, version, distro_name, project_dir, python_versions="*"):
+        self.name = name
+        self.version = version
+        self.distro_name = distro_name
+        self.project_dir = project_dir
+        self.python_versions = python_versions
+
+    @classmethod
+    def from_iced(cls, iced):
+        package = iced.poetry.package
+        return cls(
+            package.name,
+            package.version,
+            iced.distro_name,
+            iced.project_dir,
+            package.python_versions,
+        )
+
+    def to_package(self):
+        """A package standing in for the project, as a dependency of another."""
+        package = Package(self.name, self.version)
+        package.python_versions = self.python_versions
+        return package
+
+
+class LockError(Exception):
+    """A project's lock file is missing or out of date, so it can't be frozen."""
+
+
+class Fridge(dict):
+    """Summaries of the projects loaded for a run, keyed by name.
+
+    Projects are also indexed by their resolved directory, so path
+    dependencies between projects resolve to the already loaded project
+    rather than parsing its pyproject and lock file again. loader is
+    called with a project directory to load a project not seen yet,
+    by default a plain IcedPoet. claimable is called with the resolved
+    directory of a path dependency loaded on demand, whether load() may
+    claim it later in the run, by default any may be.
+    """
+
+    def __init__(self, projects=(), loader=None, claimable=None):
+        super().__init__()
+        self.by_path = {}
+        self.loader = loader
+        self.claimable = claimable
+        self.unclaimed = {}
+        for iced in projects:
+            self.add(iced)
+
+    def add(self, project):
+        """Add a project, or the summary of one."""
+        if not isinstance(project, ProjectSummary):
+            project = ProjectSummary.from_iced(project)
+        self[project.name] = project
+        self.by_path[Path(project.project_dir).resolve()] = project
+        return project
+
+    def get_project(self, project_dir):
+        """Return the summary of the project at project_dir, loading it on first use.
+
+        Projects loaded here are only indexed by path, they are path
+        dependencies of a project being frozen rather than projects
+        to freeze. The loaded project is kept until load() claims it
+        or it's released, when it's claimable, only its summary is
+        kept otherwise.
+        """
+        key = Path(project_dir).resolve()
+        summary = self.by_path.get(key)
+        if summary is None:
+            iced = (self.loader or IcedPoet)(project_dir)
+            if self.claimable is None or self.claimable(key):
+                self.unclaimed[key] = iced
+            summary = self.by_path[key] = ProjectSummary.from_iced(iced)
+        return summary
+
+    def release(self):
+        """Drop the projects loaded on demand which load() hasn't claimed."""
+        self.unclaimed.clear()
+
+    def load(self, project_dir):
+        """Load the project at project_dir to freeze it, adding its summary.
+
+        A project already loaded as a path dependency is handed over
+        rather than loaded again, the fridge only keeps its summary.
+        """
+        iced = self.unclaimed.pop(Path(project_dir).resolve(), None)
+        if iced is None:
+            iced = (self.loader or IcedPoet)(project_dir)
+        else:
+            # report it by the directory it was found in, not the dependency's path
+            iced.project_dir = project_dir
+        iced.check()
+        self.add(iced)
+        return iced
+
+
+class IcedPoet:
+    factory = ProjectFactory()
+
+    def __init__(
+        self,
+        project_dir,
+        wheel_dir="dist",
+        exclude_packages=(),
+        in_place=False,
+        plan_cache=None,
+        incremental=False,
+        output_dir=None,
+    ):
+        self.project_dir = project_dir
+        self.wheel_dir = wheel_dir
+        self.in_place = in_place
+        self.incremental = incremental
+        self.output_dir = output_dir
+        self.plan_cache = plan_cache
+        self.poetry = self.factory.create_poetry(project_dir)
+        self.fridge = None
+        self.exclude_packages = exclude_packages
+        self._lock_index = None
+        self._dependency_sources = None
+
+    @property
+    def lock_index(self):
+        if self._lock_index is None:
+            self._lock_index = LockIndex(self.poetry.locker, self.poetry.package.python_constraint)
+        return self._lock_index
+
+    def set_fridge(self, fridge):
+        if not isinstance(fridge, Fridge):
+            fridge = Fridge(fridge.values())
+        self.fridge = fridge
+
+    def check(self):
+        if not self.poetry.locker.is_locked():
+            raise LockError(f"no poetry.lock in {self.project_dir}")
+        if not self.poetry.locker.is_fresh():
+            raise LockError(f"poetry.lock in {self.project_dir} is out of date with pyproject.toml")
+
+    @property
+    def name(self):
+        return self.poetry.package.name
+
+    @property
+    def distro_name(self):
+        return distribution_name(self.name)
+
+    @property
+    def version(self):
+        return self.poetry.package.version
+
+    @property
+    def dist_version(self):
+        # the version as spelled in wheel file and dist-info directory names
+        return self.version.to_string()
+
+    def get_wheels(self):
+        dist_dir = self.project_dir / self.wheel_dir
+        wheels = list(dist_dir.glob("*whl"))
+        prefix = "%s-%s" % (self.distro_name, self.dist_version)
+        for w in wheels:
+            if not w.name.startswith(prefix):
+                continue
+            yield w
+
+    def freeze(self):
+        return [w for w, _ in self.freeze_wheels()]
+
+    def freeze_wheels(self):
+        """Freeze each of the project's wheels, yielding it and whether it was written."""
+        wheels = list(self.get_wheels())
+        if not wheels:
+            return
+        plan = self.get_freeze_plan()
+        for w in wheels:
+            yield w, self.freeze_wheel(w, plan)
+
+    def get_freeze_plan(self):
+        """Compute the frozen requirements to apply to each of the project's wheels.
+
+        This doesn't modify any of the project's dependencies, so a plan
+        can be computed any number of times. With a plan cache, a plan
+        for unchanged inputs is reused without walking the lock at all.
+        """
+        if self.plan_cache is None:
+            return self.resolve_freeze_plan()
+
+        key = self.get_plan_key()
+        plan = self.plan_cache.get(key)
+        if plan is None:
+            plan = self.resolve_freeze_plan()
+            self.plan_cache.put(key, plan)
+        return plan
+
+    def get_plan_key(self):
+        """A digest of everything resolving the project's freeze plan depends on.
+
+        That is the versions of poetry, poetry-core, poetry-plugin-export
+        and this plugin, the project's pyproject and lock file, the packages
+        excluded from freezing and the pyproject of each path dependency
+        (for their name and version).
+        """
+        project_dir = Path(self.project_dir)
+        digest = hashlib.sha256()
+
+        def add(value):
+            if isinstance(value, str):
+                value = value.encode("utf8")
+            digest.update(b"%d:" % len(value))
+            digest.update(value)
+
+        add(PLAN_CACHE_VERSION)
+        add(plan_distribution_versions())
+        add((project_dir / "pyproject.toml").read_bytes())
+        add((project_dir / "poetry.lock").read_bytes())
+        add(json.dumps(sorted(self.exclude_packages or ())))
+        for dep in self.poetry.package.dependency_group(MAIN_GROUP).dependencies:
+            if not (dep.is_file() or dep.is_directory()) or dep.is_vcs() or dep.is_url():
+                continue
+            if dep.is_directory():
+                add((dep.full_path / "pyproject.toml").read_bytes())
+            else:
+                stat = dep.full_path.stat()
+                add(f"{dep.full_path.name}:{stat.st_size}:{stat.st_mtime_ns}")
+        return digest.hexdigest()
+
+    def resolve_freeze_plan(self):
+        dep_packages = chain(self.get_path_deps(MAIN_GROUP), self.get_dep_packages())
+        return FreezePlan(
+            name=str(self.name),
+            version=str(self.version),
+            dist_info="%s-%s.dist-info" % (self.distro_name, self.dist_version),
+            requires_dist=tuple(self.get_frozen_deps(dep_packages, self.exclude_packages)),
+        )
+
+    def get_dep_packages(self):
+        # This follows poetry_plugin_export.walker.get_project_dependency_packages,
+        # over the shared lock index rather than a freshly loaded repository.
+        root_package = self.poetry.package.with_dependency_groups([MAIN_GROUP], only=True)
+        index = self.lock_index
+
+        # Build a set of all packages required by our selected extras
+        extra_package_names = get_extra_package_names(
+            index.packages, index.locked_extras, root_package.extras
+        )
+
+        # If a package is optional and we haven't opted in to it, do not select
+        selected = []
+        for require in index.with_python_marker(root_package.all_requires):
+            package = index.find_package(require)
+            if package is None:
+                continue
+            if package.optional and package.name not in extra_package_names:
+                continue
+            selected.append(require)
+
+        # the same walk as poetry_plugin_export.walker.walk_dependencies, over
+        # the index's python version regions rather than recomputing them
+        _, nested_dependencies = walk_dependency_labels(
+            [(require, 1) for require in selected], index, root_package.name
+        )
+        return [
+            DependencyPackage(dependency=dependency, package=package)
+            for package, dependency in nested_dependencies.items()
+        ]
+
+    def get_dependency_sources(self):
+        """Determine the root source of each locked dependency
+
+        For each locked dependency, determine whether it came
+        as a base requirement or part of one or more extras.
+        """
+        if self._dependency_sources is None:
+            self._dependency_sources = self._walk_dependency_sources()
+        return self._dependency_sources
+
+    def _walk_dependency_sources(self):
+        index = self.lock_index
+        root_package = self.poetry.package
+        base_requires = [
+            dep
+            for dep in root_package.requires
+            if not dep.is_optional() or set(dep.in_extras) <= root_package.features
+        ]
+
+        # Walk the base requirements and every extra's requirements together,
+        # each source is a bit in the labels of the requirements it reaches.
+        sources = ["base", *root_package.extras]
+        roots = [(require, 1) for require in index.with_python_marker(base_requires)]
+        for bit, extra in enumerate(root_package.extras, 1):
+            roots.extend(
+                (require, 1 << bit)
+                for require in index.with_python_marker(root_package.extras[extra])
+            )
+        labels, _ = walk_dependency_labels(roots, index, root_package.name)
+
+        dependency_sources = {}
+        for name, label in labels.items():
+            dependency_sources[name] = {
+                source for bit, source in enumerate(sources) if label & (1 << bit)
+            }
+        return dependency_sources
+
+    def compact_markers(self, dependency):
+        """Return a copy of a dependency with its markers consolidated.
+
+        This avoids duplication when there are multiple markers
+        (for sets of python versions, for example). It also records
+        extra dependency markers which are lost in the conversion
+        from installed package to dependency.
+        """
+        dep_sources = self.get_dependency_sources().get(dependency.name, set())
+
+        # Record extra markers only if a dependency is not included
+        # in the base requirement set.
+        new_marker = markers.without_extras(dependency.marker)
+        in_base = "base" in dep_sources
+        in_extras = dep_sources - {"base"}
+        if in_extras and not in_base:
+            new_marker = markers.multi_marker(
+                new_marker, markers.extras_marker(frozenset(in_extras))
+            )
+        dependency = dependency.clone()
+        dependency.marker = new_marker
+        return dependency
+
+    def get_frozen_deps(self, dep_packages, exclude_packages=None):
+        lines = []
+        dependency_sources = self.get_dependency_sources()
+        for dep_package in dep_packages:
+            dependency = self.compact_markers(dep_package.dependency)
+            # Freeze extra markers for dependencies which were pulled in via extras
+            # Don't freeze markers if a dependency is also part of the base
+            # dependency tree.
+            freeze_extras = "base" not in dependency_sources.get(dependency.name, set())
+            requirement = dependency.to_pep_508(with_extras=freeze_extras)
+
+            if dep_package.package.name in (exclude_packages or ()):
+                lines.append(requirement)
+                continue
+
+            require_dist = "%s (==%s)" % (dep_package.package.name, dep_package.package.version)
+            if ";" in requirement:
+                markers = requirement.split(";", 1)[1].strip()
+                require_dist += f" ; {markers}"
+            lines.append(require_dist)
+        return lines
+
+    def get_path_deps(self, group="dev"):
+        # assuming we're consistent install across deps.
+        group = self.poetry.package.dependency_group(group)
+        for dep in group.dependencies:
+            if not (dep.is_file() or dep.is_directory()):
+                continue
+            if dep.is_vcs() or dep.is_url():
+                continue
+            if self.fridge is None:
+                self.set_fridge(Fridge([self]))
+            package = self.fridge.get_project(dep.full_path).to_package()
+            # Carry markers from the root package dependency through to the iced package
+            dep = self.compact_markers(dep)
+            iced_dep = package.to_dependency()
+            iced_dep.marker = markers.multi_marker(dep.marker, iced_dep.marker)
+            package_dep = DependencyPackage(dependency=iced_dep, package=package)
+            yield package_dep
+
+    def freeze_wheel(self, wheel_path, plan, digests=None):
+        return plan.freeze_wheel(
+            wheel_path, self.in_place, self.incremental, digests, self.output_dir
+        )
@@ -0,0 +1,115 @@
+"""Load just the parts of a poetry project that freezing uses.
+
+poetry's Factory validates the whole pyproject against its schema, loads
+the global and local configuration, sets up repository pools and
+activates plugins for every project it creates. Freezing only needs the
+project package (its name, version, python constraint, dependency groups
+and extras) and the locker, so projects are built from their pyproject
+with poetry-core directly. Anything unusual is left to the full Factory.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+from poetry.core import __version__ as poetry_core_version
+from poetry.core.factory import Factory as CoreFactory
+from poetry.core.pyproject.toml import PyProjectTOML
+from poetry.packages.locker import Locker
+from poetry.plugins.plugin import Plugin
+from poetry.plugins.plugin_manager import PluginManager
+
+try:
+    from poetry.core.pyproject.exceptions import PyProjectError
+except ImportError:
+    # Account for the PyProjectException --> PyProjectError rename in Poetry 2.0
+    from poetry.core.pyproject.exceptions import PyProjectException as PyProjectError
+
+# poetry-core 1.x configures packages from the tool.poetry table alone and
+# its Locker takes that table too, projects are left to the Factory there
+LIGHT_LOADING = int(poetry_core_version.split(".")[0]) >= 2
+
+
+class ProjectPoetry:
+    """Stands in for a poetry.poetry.Poetry, with what freezing uses of one."""
+
+    __slots__ = ("pyproject_path", "local_config", "package", "locker")
+
+    def __init__(self, pyproject_path, local_config, package, locker):
+        self.pyproject_path = pyproject_path
+        self.local_config = local_config
+        self.package = package
+        self.locker = locker
+
+
+@lru_cache(maxsize=None)
+def has_poetry_plugins():
+    # plugins, unlike application plugins, may modify the projects poetry loads
+    return bool(PluginManager(Plugin.group).get_plugin_entry_points())
+
+
+class ProjectFactory:
+    """Create projects to freeze, falling back to poetry's Factory when needed.
+
+    Projects always fall back with poetry-core 1.x. Otherwise a
+    project falls back when its pyproject can't be read or lacks a
+    static name and version, when it isn't in package mode, when it
+    requires a poetry version or plugins, or when any poetry plugins are
+    installed at all, since those may change projects as they're loaded.
+    Projects loaded lightly aren't validated against poetry's schema.
+    """
+
+    def __init__(self):
+        self._core = CoreFactory()
+        self._full = None
+
+    @property
+    def full(self):
+        if self._full is None:
+            from poetry.factory import Factory
+
+            self._full = Factory()
+        return self._full
+
+    def create_poetry(self, project_dir):
+        poetry = None
+        if not has_poetry_plugins():
+            poetry = self.create_light(project_dir)
+        if poetry is None:
+            poetry = self.full.create_poetry(project_dir)
+        return poetry
+
+    def create_light(self, project_dir):
+        """Create a project from its pyproject alone, or None if it needs the full Factory."""
+        if not LIGHT_LOADING:
+            return None
+        project_dir = Path(project_dir)
+        pyproject_path = project_dir / "pyproject.toml"
+        pyproject = PyProjectTOML(path=pyproject_path)
+        try:
+            data = pyproject.data
+        except (OSError, PyProjectError):
+            return None
+        config = data.get("tool", {}).get("poetry")
+        if not data or config is None:
+            return None
+        if "requires-poetry" in config or "requires-plugins" in config:
+            return None
+        if config.get("package-mode") is False:
+            return None
+
+        project = data.get("project", {})
+        if project.get("dynamic"):
+            return None
+        name = project.get("name") or config.get("name")
+        version = project.get("version") or config.get("version")
+        if not (isinstance(name, str) and isinstance(version, str)):
+            return None
+
+        try:
+            package = self._core.get_package(name, version)
+            self._core.configure_package(package, pyproject, project_dir)
+        except (KeyError, TypeError, ValueError):
+            # left to the full Factory to report, once validated
+            return None
+        locker = Locker(project_dir / "poetry.lock", data)
+        return ProjectPoetry(pyproject_path, config, package, locker)
@@ -0,0 +1,66 @@
+"""Digests of frozen wheels, and the manifests listing them for upload tooling.
+
+Digests of rewritten wheels are computed as the new archive is written,
+so publishing doesn't read every wheel again to hash it. A manifest
+directory gets a SHA256SUMS file, as read by ``sha256sum --check``, and
+a manifest.json with the size and every digest of each of its wheels.
+Only the standard library is used, like applying a plan.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from poetry_plugin_freeze.wheel import COPY_BUFSIZE, atomic_output, open_wheel
+
+# the digests recorded for each wheel, named as package indexes name them
+DIGESTS = ("sha256", "blake2_256")
+
+SUMS_FILE = "SHA256SUMS"
+MANIFEST_FILE = "manifest.json"
+
+
+def new_hashes():
+    return {"sha256": hashlib.sha256(), "blake2_256": hashlib.blake2b(digest_size=32)}
+
+
+def hexdigests(hashes):
+    return {name: h.hexdigest() for name, h in hashes.items()}
+
+
+def file_digests(path):
+    """Digests of a file already on disk, read once in fixed size chunks."""
+    hashes = new_hashes()
+    with open_wheel(path) as fh:
+        while chunk := fh.read(COPY_BUFSIZE):
+            for h in hashes.values():
+                h.update(chunk)
+    return hexdigests(hashes)
+
+
+def write_manifests(wheels):
+    """Write the manifests of (wheel path, digests) pairs next to the wheels.
+
+    Each directory holding any of the wheels gets its own manifest files,
+    listing the wheels in it. Returns the paths written.
+    """
+    by_dir = {}
+    for wheel_path, digests in wheels:
+        wheel_path = Path(wheel_path)
+        by_dir.setdefault(wheel_path.parent, {})[wheel_path.name] = {
+            "size": wheel_path.stat().st_size,
+            **digests,
+        }
+
+    written = []
+    for directory, entries in sorted(by_dir.items()):
+        names = sorted(entries)
+        sums = "".join(f"{entries[name]['sha256']}  {name}\n" for name in names)
+        manifest = {"wheels": {name: entries[name] for name in names}}
+        with atomic_output(directory / SUMS_FILE, encoding="utf8") as fh:
+            fh.write(sums)
+        with atomic_output(directory / MANIFEST_FILE, encoding="utf8") as fh:
+            json.dump(manifest, fh, indent=2)
+            fh.write("\n")
+        written += [directory / SUMS_FILE, directory / MANIFEST_FILE]
+    return written
@@ -0,0 +1,64 @@
+"""Memoized marker operations.
+
+Marker parsing and intersection show up as a hot spot on large locks,
+where the same handful of python version and extra markers are
+rebuilt for every requirement. Markers are immutable values, so the
+results are cached (in bounded LRU caches shared across projects) and
+equal markers are interned to a single shared instance.
+"""
+
+from functools import lru_cache
+
+from poetry.core.packages.utils.utils import create_nested_marker
+from poetry.core.version.markers import MultiMarker, SingleMarker, parse_marker
+from poetry.core.version.markers import union as marker_union
+
+MARKER_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=MARKER_CACHE_SIZE)
+def intern_marker(marker):
+    """Return the shared instance of a marker equal to the given one."""
+    return marker
+
+
+@lru_cache(maxsize=256)
+def python_marker(constraint):
+    """The python_version marker for a python version constraint."""
+    return intern_marker(parse_marker(create_nested_marker("python_version", constraint)))
+
+
+@lru_cache(maxsize=MARKER_CACHE_SIZE)
+def extras_marker(extras):
+    """The union of extra markers for a frozenset of extra names."""
+    return intern_marker(marker_union(*(SingleMarker("extra", extra) for extra in sorted(extras))))
+
+
+@lru_cache(maxsize=MARKER_CACHE_SIZE)
+def intersect(marker, other):
+    return intern_marker(marker.intersect(other))
+
+
+@lru_cache(maxsize=MARKER_CACHE_SIZE)
+def without_extras(marker):
+    return intern_marker(marker.without_extras())
+
+
+@lru_cache(maxsize=MARKER_CACHE_SIZE)
+def multi_marker(*markers):
+    return intern_marker(MultiMarker(*markers))
+
+
+def cache_info():
+    """Hit/miss statistics of the marker caches, by operation."""
+    return {
+        func.__name__: func.cache_info()
+        for func in (
+            intern_marker,
+            python_marker,
+            extras_marker,
+            intersect,
+            without_extras,
+            multi_marker,
+        )
+    }
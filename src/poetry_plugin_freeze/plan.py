@@ -0,0 +1,306 @@
+"""Freeze plans, a project's frozen requirements ready to apply to its wheels.
+
+A plan is computed once per project and only holds plain data, so the
+same plan can be applied to each of the project's wheels, in this or
+in a worker process. Applying a plan only needs the standard library.
+"""
+
+from base64 import urlsafe_b64encode
+from collections import Counter
+import csv
+from dataclasses import dataclass
+from email.parser import Parser
+import hashlib
+from io import StringIO, TextIOWrapper
+import json
+from pathlib import Path
+import zipfile
+
+from poetry_plugin_freeze.manifest import file_digests, hexdigests, new_hashes
+from poetry_plugin_freeze.wheel import (
+    atomic_output,
+    copy_wheel,
+    open_wheel,
+    patch_wheel_in_place,
+    rewrite_wheel,
+)
+
+# fixed timestamp for the rewritten metadata members, for reproducible output
+METADATA_DATE_TIME = (2016, 1, 1, 0, 0, 0)
+
+# bumped on incompatible changes to the layout of emitted plan files
+PLAN_FILE_VERSION = 1
+
+# how much of a rewritten RECORD is buffered before it's written out
+RECORD_CHUNK_SIZE = 64 * 1024
+
+RECORD_CSV_PARAMS = {
+    "delimiter": csv.excel.delimiter,
+    "quotechar": csv.excel.quotechar,
+    "lineterminator": "\n",
+}
+
+
+def get_sha256_digest(content: bytes):
+    hashsum = hashlib.sha256()
+    hashsum.update(content)
+    hash_digest = urlsafe_b64encode(hashsum.digest()).decode("ascii").rstrip("=")
+    return hash_digest
+
+
+def output_path(wheel_path, output_dir=None):
+    """Where the frozen copy of a wheel goes, the wheel itself without output_dir."""
+    if output_dir is None:
+        return Path(wheel_path)
+    return Path(output_dir) / Path(wheel_path).name
+
+
+def replace_deps(dist_meta, dep_lines):
+    start_pos = 0
+
+    for m in dist_meta.get_all("Requires-Dist", ()):
+        if not start_pos:
+            start_pos = dist_meta._headers.index(("Requires-Dist", m))
+        dist_meta._headers.remove(("Requires-Dist", m))
+
+    for idx, h in enumerate(dep_lines):
+        dist_meta._headers.insert(start_pos + idx, ("Requires-Dist", h))
+
+    return dist_meta
+
+
+def read_record(wheel_path, record_path):
+    """Yield the lines of a wheel's RECORD, from a handle of its own on the wheel."""
+    with open_wheel(wheel_path) as src, zipfile.ZipFile(src) as whl, whl.open(record_path) as fh:
+        yield from TextIOWrapper(fh, encoding="utf8")
+
+
+def freeze_record(record_lines, md_path, md_bytes):
+    """Yield a RECORD with the entry of the METADATA holding md_bytes replaced.
+
+    record_lines are the lines of the original RECORD, the new one is
+    yielded encoded in chunks of about RECORD_CHUNK_SIZE as they're read,
+    so memory use doesn't grow with the number of files in the wheel.
+    """
+    output = StringIO()
+    writer = csv.writer(output, **RECORD_CSV_PARAMS)
+
+    for row in csv.reader(record_lines, **RECORD_CSV_PARAMS):
+        if not row or row[0] == md_path:
+            continue
+        writer.writerow(row)
+        if output.tell() >= RECORD_CHUNK_SIZE:
+            yield output.getvalue().encode("utf8")
+            output.seek(0)
+            output.truncate()
+
+    writer.writerow((md_path, f"sha256={get_sha256_digest(md_bytes)}", len(md_bytes)))
+    yield output.getvalue().encode("utf8")
+
+
+@dataclass(frozen=True)
+class FreezePlan:
+    """The frozen Requires-Dist lines of a project.
+
+    dist_info is the name of the .dist-info directory in the project's
+    wheels, an empty requires_dist leaves the wheel's requirements as is.
+    """
+
+    name: str
+    version: str
+    dist_info: str
+    requires_dist: tuple = ()
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "dist_info": self.dist_info,
+            "requires_dist": list(self.requires_dist),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            version=data["version"],
+            dist_info=data["dist_info"],
+            requires_dist=tuple(data.get("requires_dist", ())),
+        )
+
+    @property
+    def metadata_path(self):
+        return f"{self.dist_info}/METADATA"
+
+    @property
+    def record_path(self):
+        return f"{self.dist_info}/RECORD"
+
+    def matches_wheel(self, wheel_path):
+        """Whether a wheel file is a build of this plan's project and version."""
+        prefix = self.dist_info[: -len(".dist-info")]
+        return Path(wheel_path).name.startswith(prefix + "-")
+
+    def freeze_wheel(
+        self, wheel_path, in_place=False, incremental=False, digests=None, output_dir=None
+    ):
+        """Freeze the requirements in a wheel's metadata.
+
+        With incremental, a wheel whose metadata already holds the frozen
+        requirements is left alone; only the central directory and the
+        METADATA member are read to tell. Returns whether the wheel was
+        written.
+
+        digests, when given, is a dict filled with the digests of the
+        frozen wheel file. They're computed as a rewritten wheel is
+        written, wheels patched in place or left alone are read for them.
+
+        With output_dir the frozen wheel is written to that directory and
+        the wheel itself is left alone, an already frozen wheel is copied
+        there as is. in_place doesn't apply then.
+        """
+        md_path = self.metadata_path
+        record_path = self.record_path
+
+        with open_wheel(wheel_path) as src, zipfile.ZipFile(src) as source_whl:
+            # freeze deps in metadata, serialized once for its member and record
+            md_bytes = source_whl.read(md_path)
+            dist_meta = Parser().parsestr(md_bytes.decode("utf8"))
+            if self.requires_dist:
+                replace_deps(dist_meta, self.requires_dist)
+            frozen_md = str(dist_meta).encode("utf8")
+            if incremental and frozen_md == md_bytes:
+                if output_dir is not None:
+                    hashes = None if digests is None else new_hashes()
+                    copy_wheel(wheel_path, output_path(wheel_path, output_dir), hashes)
+                    if digests is not None:
+                        digests.update(hexdigests(hashes))
+                elif digests is not None:
+                    digests.update(file_digests(wheel_path))
+                return False
+            sample = source_whl.getinfo(md_path)
+
+        md_info = zipfile.ZipInfo(md_path, METADATA_DATE_TIME)
+        md_info.external_attr = sample.external_attr
+
+        record_info = zipfile.ZipInfo(record_path, METADATA_DATE_TIME)
+        record_info.external_attr = sample.external_attr
+
+        # the record is streamed from the source wheel into the new one
+        record = freeze_record(read_record(wheel_path, record_path), md_path, frozen_md)
+        if output_dir is None and in_place:
+            # patching overwrites the source record, read it all up front
+            record = b"".join(record)
+        members = [(md_info, frozen_md), (record_info, record)]
+        if output_dir is None and in_place and patch_wheel_in_place(wheel_path, members):
+            if digests is not None:
+                digests.update(file_digests(wheel_path))
+            return True
+
+        hashes = None if digests is None else new_hashes()
+        rewrite_wheel(wheel_path, members, hashes, output_path(wheel_path, output_dir))
+        if digests is not None:
+            digests.update(hexdigests(hashes))
+        return True
+
+    def check_wheel(self, wheel_path):
+        """Find where a wheel differs from being frozen by this plan, without writing it.
+
+        Only the central directory and the METADATA and RECORD members
+        are read. Returns a list of problems, empty when the wheel's
+        requirements are frozen as planned and its RECORD holds the
+        hash of its METADATA.
+        """
+        md_path = self.metadata_path
+        with zipfile.ZipFile(wheel_path) as whl:
+            md_bytes = whl.read(md_path)
+            with whl.open(self.record_path) as fh:
+                lines = TextIOWrapper(fh, encoding="utf8")
+                rows = [r for r in csv.reader(lines, **RECORD_CSV_PARAMS) if r and r[0] == md_path]
+
+        problems = []
+        if self.requires_dist:
+            dist_meta = Parser().parsestr(md_bytes.decode("utf8"), headersonly=True)
+            requires = dist_meta.get_all("Requires-Dist", [])
+            expected = list(self.requires_dist)
+            missing = Counter(expected) - Counter(requires)
+            unexpected = Counter(requires) - Counter(expected)
+            problems += [f"missing Requires-Dist: {r}" for r in missing.elements()]
+            problems += [f"unexpected Requires-Dist: {r}" for r in unexpected.elements()]
+            if not problems and requires != expected:
+                problems.append("Requires-Dist out of order")
+
+        digest = f"sha256={get_sha256_digest(md_bytes)}"
+        if not rows:
+            problems.append(f"{md_path} missing from RECORD")
+        elif rows[-1][1:3] != [digest, str(len(md_bytes))]:
+            problems.append(f"RECORD hash of {md_path} doesn't match its content")
+        return problems
+
+
+def freeze_wheel(
+    plan,
+    wheel_path,
+    in_place=False,
+    incremental=False,
+    digest=False,
+    output_dir=None,
+    timings=None,
+):
+    """Apply a plan to a wheel, the unit of work for --jobs wheel workers.
+
+    Returns the frozen wheel's path, whether it was written and, with
+    digest, the digests of the frozen wheel or else None.
+    """
+    digests = {} if digest else None
+    args = (in_place, incremental, digests, output_dir)
+    if timings is None:
+        written = plan.freeze_wheel(wheel_path, *args)
+    else:
+        written = timings.freeze_wheel(
+            plan.name,
+            wheel_path,
+            plan.freeze_wheel,
+            *args,
+            output_path=output_path(wheel_path, output_dir),
+        )
+    return output_path(wheel_path, output_dir), written, digests
+
+
+def check_wheel(plan, wheel_path, output_dir=None):
+    """Check the frozen copy of a wheel against a plan, in output_dir if given.
+
+    Returns the frozen wheel's path and its problems, a copy missing
+    from output_dir being one.
+    """
+    target = output_path(wheel_path, output_dir)
+    if output_dir is not None and not target.is_file():
+        return target, [f"missing from {output_dir}"]
+    return target, plan.check_wheel(target)
+
+
+def write_plan_file(path, projects):
+    """Write (project path, plan) pairs to a json plan file.
+
+    Project paths are stored relative to the directory the plans were
+    emitted from, so the file can be applied in another checkout.
+    """
+    data = {
+        "version": PLAN_FILE_VERSION,
+        "projects": [
+            {"path": Path(project_path).as_posix(), **plan.to_dict()}
+            for project_path, plan in projects
+        ],
+    }
+    with atomic_output(path, encoding="utf8") as fh:
+        json.dump(data, fh, indent=2)
+        fh.write("\n")
+
+
+def read_plan_file(path):
+    """Read the (project path, plan) pairs of a json plan file."""
+    with open(path, encoding="utf8") as fh:
+        data = json.load(fh)
+    if data.get("version") != PLAN_FILE_VERSION:
+        raise ValueError(f"unsupported plan file version {data.get('version')!r} in {path}")
+    return [(Path(entry["path"]), FreezePlan.from_dict(entry)) for entry in data["projects"]]
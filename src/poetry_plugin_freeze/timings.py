@@ -0,0 +1,173 @@
+"""Wall and cpu time accounting of freeze runs, for --timings and --report.
+
+A run is split in phases, discovering projects, loading them with
+poetry, planning their frozen requirements (the lock walk) and freezing
+their wheels, or checking them with --check. Time is recorded per phase
+overall and per project, along with size statistics of each frozen wheel.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import time
+import zipfile
+
+from poetry_plugin_freeze.wheel import count_io
+
+PHASES = ("discover", "load", "plan", "freeze", "check")
+
+
+class Elapsed:
+    """The time taken by one timed block, filled in when the block exits.
+
+    project may be assigned within the block, for phases which only
+    learn the project's name along the way.
+    """
+
+    __slots__ = ("project", "wall", "cpu")
+
+    def __init__(self, project=None):
+        self.project = project
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+def wheel_stats(wheel_path):
+    """Member count and sizes of a wheel, from its central directory."""
+    with zipfile.ZipFile(wheel_path) as whl:
+        infos = whl.infolist()
+    size = sum(i.file_size for i in infos)
+    compressed = sum(i.compress_size for i in infos)
+    return {
+        "members": len(infos),
+        "uncompressed_size": size,
+        "compressed_size": compressed,
+        "compression_ratio": round(size / compressed, 3) if compressed else None,
+    }
+
+
+class Timings:
+    """Time recorded by phase, by project and by wheel.
+
+    A disabled instance records nothing, so callers can time their work
+    unconditionally.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+        self.projects = {}
+        self.wheels = []
+
+    @contextmanager
+    def phase(self, name, project=None):
+        elapsed = Elapsed(project)
+        if not self.enabled:
+            yield elapsed
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield elapsed
+        finally:
+            elapsed.wall = time.perf_counter() - wall
+            elapsed.cpu = time.process_time() - cpu
+            self.add(name, elapsed.wall, elapsed.cpu, elapsed.project)
+
+    def iterate(self, name, iterable):
+        """Yield the items of iterable, timing the work of producing them as a phase."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, name, wall, cpu, project=None):
+        targets = [self.phases]
+        if project is not None:
+            targets.append(self.projects.setdefault(str(project), {}))
+        for target in targets:
+            totals = target.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            totals["wall"] += wall
+            totals["cpu"] += cpu
+
+    def freeze_wheel(self, project, wheel_path, freeze, *args, output_path=None):
+        """Call freeze(wheel_path, *args) as part of the freeze phase.
+
+        Also records the bytes read from and written to wheel files while
+        freezing, the file sizes of the wheel and of its frozen copy, at
+        output_path when it's written elsewhere, and the frozen wheel's
+        size statistics. output_size is 0 when nothing was written.
+        Returns whether the wheel was written as freeze does.
+        """
+        if not self.enabled:
+            return freeze(wheel_path, *args)
+        output_path = output_path or wheel_path
+        input_size = os.path.getsize(wheel_path)
+        with self.phase("freeze", project) as elapsed, count_io() as io:
+            written = freeze(wheel_path, *args)
+        self.wheels.append(
+            {
+                "project": str(project),
+                "wheel": str(output_path),
+                "written": written,
+                "wall": elapsed.wall,
+                "cpu": elapsed.cpu,
+                "bytes_read": io.read,
+                "bytes_written": io.written,
+                "input_size": input_size,
+                "output_size": os.path.getsize(output_path) if written else 0,
+                **wheel_stats(output_path),
+            }
+        )
+        return written
+
+    def merge(self, other):
+        """Add in the timings recorded by another instance, such as a worker's."""
+        for name, totals in other.phases.items():
+            self.add(name, totals["wall"], totals["cpu"])
+        for project, phases in other.projects.items():
+            for name, totals in phases.items():
+                target = self.projects.setdefault(project, {})
+                target = target.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+                target["wall"] += totals["wall"]
+                target["cpu"] += totals["cpu"]
+        self.wheels.extend(other.wheels)
+
+    def to_dict(self):
+        return {"phases": self.phases, "projects": self.projects, "wheels": self.wheels}
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf8") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+            fh.write("\n")
+
+    def format_lines(self):
+        """Summary lines of time per phase, then per project and phase."""
+        lines = []
+        for name in sorted(self.phases, key=phase_order):
+            totals = self.phases[name]
+            lines.append(f"{name:<10} {totals['wall']:8.3f}s wall {totals['cpu']:8.3f}s cpu")
+        for project in sorted(self.projects):
+            for name in sorted(self.projects[project], key=phase_order):
+                totals = self.projects[project][name]
+                lines.append(
+                    f"{project} {name:<10} {totals['wall']:8.3f}s wall {totals['cpu']:8.3f}s cpu"
+                )
+        return lines
+
+
+def phase_order(name):
+    return PHASES.index(name) if name in PHASES else len(PHASES)
+
+
+def run_timed(func, enabled, *args):
+    """Call func(*args, timings=...) with fresh timings, for worker processes.
+
+    Returns the result along with the timings, for the parent to merge
+    since a worker's cpu time can't be measured from outside of it.
+    """
+    timings = Timings(enabled)
+    return func(*args, timings=timings), timings
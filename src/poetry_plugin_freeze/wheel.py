@@ -0,0 +1,381 @@
+"""Zip level helpers for rewriting wheel archives.
+
+These only depend on the standard library and operate on the
+compressed member data directly, so unchanged members never have
+to be inflated and deflated again.
+"""
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import copy
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+
+COPY_BUFSIZE = 1024 * 1024
+
+# upper bound on the member data that may be shifted when patching in place,
+# past that a full rewrite, written aside and renamed over the wheel, is
+# just as cheap. Patching itself isn't atomic, see patch_wheel_in_place.
+MAX_INPLACE_MOVE = 16 * COPY_BUFSIZE
+
+# the IOCounts wheel files opened by these helpers are counted into, see count_io
+io_counts = ContextVar("io_counts", default=None)
+
+# general purpose flag bit signalling crc and sizes follow the member data
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_EXTRA_ID = 0x0001
+
+
+def strip_zip64_extra(extra: bytes) -> bytes:
+    """Remove any zip64 extended information from an extra field block.
+
+    ZipInfo.FileHeader adds a fresh zip64 record when the member needs
+    one, so a stale copy from the source archive must not be carried over.
+    """
+    stripped = []
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[pos : pos + 4])
+        end = pos + 4 + size
+        if header_id != ZIP64_EXTRA_ID:
+            stripped.append(extra[pos:end])
+        pos = end
+    return b"".join(stripped)
+
+
+def member_data_offset(fp, info: zipfile.ZipInfo) -> int:
+    """Return the offset of a member's compressed data within the archive file."""
+    fp.seek(info.header_offset)
+    fheader = fp.read(zipfile.sizeFileHeader)
+    if len(fheader) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile("Truncated file header for %s" % info.filename)
+    fheader = struct.unpack(zipfile.structFileHeader, fheader)
+    if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile("Bad magic number for file header of %s" % info.filename)
+    return (
+        info.header_offset
+        + zipfile.sizeFileHeader
+        + fheader[zipfile._FH_FILENAME_LENGTH]
+        + fheader[zipfile._FH_EXTRA_FIELD_LENGTH]
+    )
+
+
+def copy_range(src_fp, dst_fp, offset, length, bufsize=COPY_BUFSIZE):
+    """Copy length bytes starting at offset in src_fp to the current position of dst_fp."""
+    src_fp.seek(offset)
+    remaining = length
+    while remaining:
+        chunk = src_fp.read(min(bufsize, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of archive data")
+        dst_fp.write(chunk)
+        remaining -= len(chunk)
+
+
+def move_range(fp, src_offset, dst_offset, length, bufsize=COPY_BUFSIZE):
+    """Move length bytes within fp from src_offset down to dst_offset."""
+    assert dst_offset <= src_offset
+    while length:
+        fp.seek(src_offset)
+        chunk = fp.read(min(bufsize, length))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of archive data")
+        fp.seek(dst_offset)
+        fp.write(chunk)
+        src_offset += len(chunk)
+        dst_offset += len(chunk)
+        length -= len(chunk)
+
+
+def copy_member_raw(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """Copy a member's compressed bytes from source into target unchanged.
+
+    The compression method, crc, sizes and attributes of the member are
+    kept as is, only the local header is regenerated for its new offset.
+    """
+    data_offset = member_data_offset(source.fp, info)
+
+    zinfo = copy.copy(info)
+    # crc and sizes are known up front, so they go in the local header
+    # rather than a trailing data descriptor.
+    zinfo.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    zinfo.extra = strip_zip64_extra(info.extra)
+
+    target._writecheck(zinfo)
+    zinfo.header_offset = target.fp.tell()
+    target.fp.write(zinfo.FileHeader())
+    copy_range(source.fp, target.fp, data_offset, zinfo.compress_size)
+
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+    return zinfo
+
+
+class HashingWriter:
+    """A file being written, feeding each byte to hashes as it's written.
+
+    zipfile seeks back to fill in a member's local header once the
+    member's data is written, the bytes written within hold() are only
+    hashed as the block exits, when they're final. Everything else must
+    be written in order.
+    """
+
+    def __init__(self, fileobj, hashes):
+        self.fileobj = fileobj
+        self.hashes = hashes
+        self.hashed = fileobj.tell()
+        self.held = None
+
+    def write(self, data):
+        offset = self.fileobj.tell() - self.hashed
+        if self.held is not None and 0 <= offset <= len(self.held):
+            self.held[offset : offset + len(data)] = data
+        elif self.held is None and offset == 0:
+            for h in self.hashes.values():
+                h.update(data)
+            self.hashed += len(data)
+        else:
+            raise ValueError("out of order write to a hashed file")
+        return self.fileobj.write(data)
+
+    @contextmanager
+    def hold(self):
+        self.held = bytearray()
+        try:
+            yield
+        finally:
+            held, self.held = self.held, None
+            for h in self.hashes.values():
+                h.update(held)
+            self.hashed += len(held)
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class IOCounts:
+    """Bytes read from and written to wheel files."""
+
+    __slots__ = ("read", "written")
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+
+
+class CountingFile:
+    """A file adding the bytes read from and written through it to an IOCounts."""
+
+    def __init__(self, fileobj, counts):
+        self.fileobj = fileobj
+        self.counts = counts
+
+    def read(self, *args):
+        data = self.fileobj.read(*args)
+        self.counts.read += len(data)
+        return data
+
+    def write(self, data):
+        written = self.fileobj.write(data)
+        self.counts.written += len(data) if written is None else written
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+@contextmanager
+def count_io():
+    """Count the bytes read and written by wheel helpers within the block.
+
+    Yields the IOCounts filled in as wheel files are read and written,
+    as opposed to their sizes, which say little about the work done when
+    wheels are patched in place or left alone.
+    """
+    counts = IOCounts()
+    token = io_counts.set(counts)
+    try:
+        yield counts
+    finally:
+        io_counts.reset(token)
+
+
+def counted(fileobj):
+    counts = io_counts.get()
+    return fileobj if counts is None else CountingFile(fileobj, counts)
+
+
+@contextmanager
+def open_wheel(path, mode="rb"):
+    """Open a wheel file, counting its I/O within count_io()."""
+    with open(path, mode) as fh:
+        yield counted(fh)
+
+
+def member_name(zinfo_or_arcname):
+    if isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+        return zinfo_or_arcname.filename
+    return zinfo_or_arcname
+
+
+def write_member(target: zipfile.ZipFile, zinfo_or_arcname, data):
+    """Add a deflated member to target from bytes or an iterable of byte chunks.
+
+    Chunks are compressed as they are written, so memory use doesn't
+    depend on the size of the member. Members which may grow past the
+    zip64 limit should carry their expected size as the ZipInfo's
+    file_size, zipfile sizes the local header up front from it.
+    """
+    if isinstance(data, (bytes, str)):
+        target.writestr(zinfo_or_arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+        return
+    if isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+        zinfo = copy.copy(zinfo_or_arcname)
+    else:
+        zinfo = zipfile.ZipInfo(zinfo_or_arcname, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    with target.open(zinfo, "w") as member_fh:
+        for chunk in data:
+            member_fh.write(chunk)
+
+
+def new_file_mode():
+    """The permission bits open() gives new files, under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_output(path, mode_from=None, encoding=None):
+    """Yield a temporary file to write, moved over path once written.
+
+    The temporary file is created next to path, so it's on the same
+    filesystem and the final step is an atomic rename rather than a
+    copy. Its name doesn't end in .whl or .json, so neither wheel globs
+    nor the plan cache ever match it. The file is opened in text mode
+    with encoding, if given. The permission bits of mode_from are copied
+    over, if given, otherwise the file gets those of any new file rather
+    than the owner only bits mkstemp creates it with.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        if encoding is None:
+            with os.fdopen(fd, "w+b") as fh:
+                yield counted(fh)
+        else:
+            with os.fdopen(fd, "w", encoding=encoding) as fh:
+                yield fh
+        if mode_from is not None:
+            shutil.copymode(mode_from, temp_path)
+        else:
+            os.chmod(temp_path, new_file_mode())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def copy_wheel(wheel_path, output_path, hashes=None):
+    """Copy a wheel as is, updating hashes with it as it's written."""
+    with open_wheel(wheel_path) as src, atomic_output(output_path, wheel_path) as fh:
+        out = fh if hashes is None else HashingWriter(fh, hashes)
+        shutil.copyfileobj(src, out, COPY_BUFSIZE)
+
+
+def rewrite_wheel(wheel_path, members, hashes=None, output_path=None):
+    """Write a new copy of the wheel with members replaced, then move it over the original.
+
+    members is a sequence of (zinfo_or_arcname, data) pairs as accepted by
+    write_member, they are added after all the unchanged members. Both
+    are streamed with fixed size buffers, however large the members.
+    hashes, a dict of hashlib objects, are updated with the whole new
+    file as it's written. With output_path the new copy is written there
+    instead, leaving the original wheel alone.
+    """
+    replaced = {member_name(m) for m, _ in members}
+
+    with open_wheel(wheel_path) as src, zipfile.ZipFile(src) as source_whl:
+        with atomic_output(output_path or wheel_path, wheel_path) as fd_file:
+            out = fd_file if hashes is None else HashingWriter(fd_file, hashes)
+            hold = nullcontext if hashes is None else out.hold
+            with zipfile.ZipFile(out, mode="w", compression=zipfile.ZIP_DEFLATED) as frozen_whl:
+                # first copy all unchanged files to frozen zip as is
+                for info in source_whl.infolist():
+                    if info.filename in replaced:
+                        continue
+                    copy_member_raw(source_whl, frozen_whl, info)
+
+                # finally add in our modified files
+                for zinfo_or_arcname, data in members:
+                    with hold():
+                        write_member(frozen_whl, zinfo_or_arcname, data)
+
+
+def patch_wheel_in_place(wheel_path, members, max_move=MAX_INPLACE_MOVE):
+    """Replace members of the wheel by patching the archive file in place.
+
+    The local entries of replaced members are dropped by shifting any
+    members stored after them down over the gap, the new members and a
+    new central directory are appended and the file is truncated. For
+    wheels where the dist-info sits at the end of the archive (as build
+    backends write it) the cost is proportional to the metadata rather
+    than the size of the wheel.
+
+    Returns False without touching the file when the archive layout
+    isn't one we can safely patch, callers should then fall back to a
+    full rewrite. Once members start moving the file is modified as it
+    goes, an error or interruption past that point leaves a damaged
+    wheel behind, which nothing restores.
+    """
+    replaced = {member_name(m) for m, _ in members}
+
+    with open_wheel(wheel_path, "r+b") as fh:
+        with zipfile.ZipFile(fh) as whl:
+            infos = sorted(whl.infolist(), key=lambda i: i.header_offset)
+            start_dir = whl.start_dir
+
+        # archives with a prefix, duplicate names or overlapping entries
+        # are left to a rewrite.
+        offsets = [i.header_offset for i in infos] + [start_dir]
+        if offsets[0] != 0 or any(a >= b for a, b in zip(offsets, offsets[1:])):
+            return False
+        extents = {i.filename: (start, end) for i, start, end in zip(infos, offsets, offsets[1:])}
+        if len(extents) != len(infos):
+            return False
+
+        stale = [i for i in infos if i.filename in replaced]
+        cut = min((i.header_offset for i in stale), default=start_dir)
+        moving = [i for i in infos if i.header_offset > cut and i.filename not in replaced]
+        if sum(extents[i.filename][1] - extents[i.filename][0] for i in moving) > max_move:
+            return False
+
+        with zipfile.ZipFile(fh, mode="a", compression=zipfile.ZIP_DEFLATED) as whl:
+            # shift the members stored after the first stale entry down,
+            # each entry (local header, data and any data descriptor) is
+            # moved as is, so only its offset in the directory changes.
+            write_pos = cut
+            for info in moving:
+                start, end = extents[info.filename]
+                move_range(whl.fp, start, write_pos, end - start)
+                whl.getinfo(info.filename).header_offset = write_pos
+                write_pos += end - start
+
+            whl.filelist = [i for i in whl.filelist if i.filename not in replaced]
+            for name in replaced:
+                whl.NameToInfo.pop(name, None)
+            whl.start_dir = write_pos
+            whl._didModify = True
+
+            for zinfo_or_arcname, data in members:
+                write_member(whl, zinfo_or_arcname, data)
+        fh.truncate()
+    return True
@@ -1,8 +1,14 @@
 from pathlib import Path
 
+from cleo.io.null_io import NullIO
+from cleo.testers.command_tester import CommandTester
+from poetry.console.application import Application
+from poetry.factory import Factory
 import pytest
 import shutil
 
+from poetry_plugin_freeze.wheel import member_data_offset
+
 
 @pytest.fixture
 def fixture_root() -> Path:
@@ -16,3 +22,36 @@ def fixture_copy(tmp_path):
         return tmp_path / path.name
 
     return copy
+
+
+@pytest.fixture(autouse=True)
+def poetry_cache_dir(tmp_path_factory, monkeypatch):
+    # keep freeze plans cached by command runs out of the user's poetry cache
+    cache_dir = tmp_path_factory.mktemp("poetry-cache")
+    monkeypatch.setenv("POETRY_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def run_freeze_command():
+    def run(project_dir, args=""):
+        poetry = Factory().create_poetry(project_dir)
+        app = Application()
+        app._poetry = poetry
+        app._load_plugins(NullIO())
+
+        tester = CommandTester(app.find("freeze-wheel"))
+        status = tester.execute(args)
+        return status, tester.io.fetch_output(), tester.io.fetch_error()
+
+    return run
+
+
+@pytest.fixture
+def raw_member_bytes():
+    def read(zf, info):
+        # the member's data as stored in the archive, still compressed
+        zf.fp.seek(member_data_offset(zf.fp, info))
+        return zf.fp.read(info.compress_size)
+
+    return read
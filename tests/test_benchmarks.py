@@ -0,0 +1,24 @@
+from pathlib import Path
+import subprocess
+import sys
+
+BENCHMARKS = Path(__file__).parent.parent / "benchmarks"
+
+
+def test_benchmarks_smoke(tmp_path):
+    result = subprocess.run(
+        [sys.executable, str(BENCHMARKS / "run.py"), "tiny", "--repeat", "1", "--no-compare"],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+    assert result.returncode == 0, result.stderr
+    timed = [line.split()[0] for line in result.stdout.splitlines()[1:]]
+    assert timed == [
+        "project_roots",
+        "iced_poet",
+        "get_dep_packages",
+        "get_frozen_deps",
+        "freeze_wheel",
+        "peak_memory_mb",
+    ]
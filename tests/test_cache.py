@@ -0,0 +1,34 @@
+import os
+
+from poetry_plugin_freeze.cache import PlanCache
+from poetry_plugin_freeze.plan import FreezePlan
+
+
+def make_plan(name="app", requires=("attrs (==22.2.0)",)):
+    return FreezePlan(name, "0.1", f"{name}-0.1.dist-info", tuple(requires))
+
+
+def test_plan_cache_roundtrip(tmp_path):
+    cache = PlanCache(tmp_path / "plans")
+    assert cache.get("abc") is None
+
+    plan = make_plan()
+    cache.put("abc", plan)
+    assert cache.get("abc") == plan
+    assert os.listdir(tmp_path / "plans") == ["abc.json"]
+
+    (tmp_path / "plans" / "abc.json").write_text("{not json")
+    assert cache.get("abc") is None
+
+
+def test_plan_cache_eviction(tmp_path):
+    cache = PlanCache(tmp_path)
+    for idx, key in enumerate("abc"):
+        cache.put(key, make_plan(requires=["x" * 100]))
+        os.utime(tmp_path / f"{key}.json", (idx, idx))
+
+    cache.max_size = (tmp_path / "a.json").stat().st_size * 2
+    # reading an entry marks it as recently used
+    assert cache.get("a") is not None
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json"]
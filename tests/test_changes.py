@@ -0,0 +1,127 @@
+import shutil
+import subprocess
+
+import pytest
+
+from poetry_plugin_freeze.changes import ChangeSet, read_path_deps
+
+
+def git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(fixture_root, fixture_copy):
+    package = fixture_copy(fixture_root / "nested_packages")
+    git(package, "init", "-q")
+    git(package, "add", "-A")
+    git(package, "commit", "-q", "-m", "initial")
+    return package
+
+
+def selected(repo, ref="HEAD", **options):
+    changes = ChangeSet(repo, ref, **options)
+    projects = [
+        repo,
+        repo / "others" / "app_c",
+        repo / "others" / "app_no_deps",
+        repo / "others" / "app_with_extras",
+    ]
+    return sorted(p.relative_to(repo).as_posix() for p in changes.filter(projects))
+
+
+def test_read_path_deps(fixture_root):
+    project = fixture_root / "nested_packages" / "others" / "app_with_extras"
+    assert sorted(p.name for p in read_path_deps(project)) == ["app_c", "nested_packages"]
+
+
+def test_changed_since_nothing(repo):
+    assert selected(repo) == []
+
+
+def test_changed_since_dependents(repo):
+    # app_with_extras depends on app_c by path
+    (repo / "others" / "app_c" / "app_c" / "__init__.py").write_text("changed = True\n")
+    assert selected(repo) == ["others/app_c", "others/app_with_extras"]
+
+
+def test_changed_since_lock_file(repo):
+    lock = repo / "others" / "app_no_deps" / "poetry.lock"
+    lock.write_text(lock.read_text() + "\n")
+    assert selected(repo) == ["others/app_no_deps"]
+
+
+def test_changed_since_dev_path_deps(repo):
+    # app_c and app_no_deps only depend on app_b, the root project, for development
+    (repo / "app_b" / "new.py").write_text("")
+    assert selected(repo) == [".", "others/app_with_extras"]
+
+
+def test_changed_since_transitive(repo):
+    pyproject = repo / "others" / "app_c" / "pyproject.toml"
+    pyproject.write_text(
+        pyproject.read_text().replace(
+            'pytest = "^7.1"', 'pytest = "^7.1"\napp-no-deps = {path = "../app_no_deps"}'
+        )
+    )
+    git(repo, "commit", "-q", "-am", "app_c depends on app_no_deps")
+    (repo / "others" / "app_no_deps" / "app_no_deps" / "__init__.py").write_text("x = 1\n")
+    assert selected(repo) == ["others/app_c", "others/app_no_deps", "others/app_with_extras"]
+
+
+def test_changed_since_untracked_wheels(repo):
+    # wheels built or frozen since aren't changes, tracked or not
+    for w in list(repo.rglob("*.whl")):
+        shutil.copy(w, w.with_name(w.name.replace("-py3", ".post1-py3")))
+        w.write_bytes(b"")
+    wheelhouse = repo / "wheelhouse"
+    wheelhouse.mkdir()
+    (wheelhouse / "app_c-0.2-py3-none-any.whl").write_bytes(b"")
+    assert selected(repo, output_dir=wheelhouse) == []
+    assert selected(repo, wheel_dir="build", output_dir=wheelhouse) == [
+        ".",
+        "others/app_c",
+        "others/app_no_deps",
+        "others/app_with_extras",
+    ]
+
+
+def test_changed_since_symlinked_root(repo, tmp_path):
+    # git resolves the symlink in the top level, the projects are found below the link
+    link = tmp_path / "link"
+    link.symlink_to(repo, target_is_directory=True)
+    (repo / "others" / "app_no_deps" / "app_no_deps" / "__init__.py").write_text("x = 1\n")
+    assert selected(link) == ["others/app_no_deps"]
+
+
+def test_changed_since_committed(repo):
+    (repo / "others" / "app_no_deps" / "app_no_deps" / "__init__.py").write_text("x = 1\n")
+    git(repo, "commit", "-q", "-am", "change")
+    assert selected(repo) == []
+    assert selected(repo, "HEAD~1") == ["others/app_no_deps"]
+
+
+def test_changed_since_bad_ref(repo):
+    with pytest.raises(RuntimeError, match="failed"):
+        ChangeSet(repo, "no-such-ref")
+
+
+def test_freeze_changed_since(repo, monkeypatch, run_freeze_command):
+    monkeypatch.chdir(repo)
+    (repo / "others" / "app_c" / "app_c" / "__init__.py").write_text("changed = True\n")
+    status, output, _ = run_freeze_command(repo, "--changed-since HEAD")
+    assert status == 0
+    assert sorted(output.splitlines()[1:-1]) == [
+        f"froze app-c 0.2 -> {repo}/others/app_c/dist/app_c-0.2-py3-none-any.whl",
+        f"froze app-with-extras 0.1.0 -> {repo}/others/app_with_extras/dist"
+        "/app_with_extras-0.1.0-py3-none-any.whl",
+    ]
+
+    status, _, error = run_freeze_command(repo, "--changed-since no-such-ref")
+    assert status == 1
+    assert "--changed-since: git diff" in error
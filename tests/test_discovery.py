@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import pytest
+
+from poetry_plugin_freeze.discovery import GitIgnore, ProjectFinder, explicit_projects
+
+
+@pytest.fixture
+def tree(tmp_path) -> Path:
+    for project in (
+        "",
+        "libs/alpha",
+        "libs/beta",
+        "libs/beta/vendor/gamma",
+        "apps/web",
+        "apps/web/node_modules/dep",
+        ".git/modules/sub",
+        ".tox/py311/lib/pkg",
+        "build/lib/pkg",
+        "scratch/tmp",
+        "env/lib/python3.11/site-packages/pkg",
+        "tools/conda/lib/pkg",
+    ):
+        path = tmp_path / project
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "pyproject.toml").write_text("")
+    (tmp_path / "env" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    (tmp_path / "tools" / "conda" / "conda-meta").mkdir()
+    (tmp_path / ".gitignore").write_text("# local bits\nscratch/\n/libs/beta/vendor\n")
+    return tmp_path
+
+
+def relative(root, paths):
+    return [str(p.relative_to(root)) for p in paths]
+
+
+def test_finder_deny_list(tree):
+    assert relative(tree, ProjectFinder(tree)) == [
+        ".",
+        "apps/web",
+        "libs/alpha",
+        "libs/beta",
+        "libs/beta/vendor/gamma",
+        "scratch/tmp",
+    ]
+
+
+def test_finder_gitignore(tree):
+    assert relative(tree, ProjectFinder(tree, gitignore=True)) == [
+        ".",
+        "apps/web",
+        "libs/alpha",
+        "libs/beta",
+    ]
+
+
+def test_finder_max_depth(tree):
+    assert relative(tree, ProjectFinder(tree, max_depth=0)) == ["."]
+    assert relative(tree, ProjectFinder(tree, max_depth=2)) == [
+        ".",
+        "apps/web",
+        "libs/alpha",
+        "libs/beta",
+        "scratch/tmp",
+    ]
+
+
+def test_finder_include_exclude(tree):
+    finder = ProjectFinder(tree, include=["libs/*"], exclude=["*/vendor"])
+    assert relative(tree, finder) == ["libs/alpha", "libs/beta"]
+
+    finder = ProjectFinder(tree, excludes=[tree / "libs"])
+    assert relative(tree, finder) == [".", "apps/web", "scratch/tmp"]
+
+
+def test_gitignore_rules():
+    ignore = GitIgnore.from_lines(["*.egg-info/", "/dist", "docs/**/build", "!keep.egg-info"])
+    assert ignore.match("src/pkg.egg-info", is_dir=True) is True
+    assert ignore.match("src/pkg.egg-info", is_dir=False) is None
+    assert ignore.match("keep.egg-info", is_dir=True) is False
+    assert ignore.match("dist", is_dir=True) is True
+    assert ignore.match("sub/dist", is_dir=True) is None
+    assert ignore.match("docs/a/b/build", is_dir=True) is True
+
+    ignore = GitIgnore.from_lines(["/dist/"])
+    assert ignore.match("dist", is_dir=True) is True
+    assert ignore.match("dist", is_dir=False) is None
+    assert ignore.match("libs/dist", is_dir=True) is None
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"max_depth": 2},
+        {"include": ["libs/*"], "exclude": ["*/vendor"]},
+        {"excludes": ["libs"]},
+    ],
+)
+def test_finder_may_find(tree, options):
+    if "excludes" in options:
+        options = {"excludes": [tree / e for e in options["excludes"]]}
+    finder = ProjectFinder(tree, **options)
+    projects = [p.parent for p in sorted(tree.rglob("pyproject.toml"))]
+    found = set(finder)
+    # environments are only recognized by walking into them
+    walked = [p for p in projects if "env" not in p.parts and "conda" not in p.parts]
+    assert [p for p in walked if finder.may_find(p)] == [p for p in walked if p in found]
+    assert not finder.may_find(tree.parent)
+
+
+def test_explicit_projects(tree):
+    projects = explicit_projects(
+        tree, ["libs/*", "apps/web/pyproject.toml", "missing", "libs/alpha"]
+    )
+    assert relative(tree, projects) == ["libs/alpha", "libs/beta", "apps/web"]
+
+
+def test_finder_skips_environments(tree):
+    assert "env/lib/python3.11/site-packages/pkg" not in relative(tree, ProjectFinder(tree))
+    assert "tools/conda/lib/pkg" not in relative(tree, ProjectFinder(tree))
+    assert "env/lib/python3.11/site-packages/pkg" in relative(
+        tree, ProjectFinder(tree, skip_venvs=False)
+    )
@@ -1,14 +1,30 @@
 import csv
+import hashlib
+import json
+import os
+import pickle
 import re
+import shutil
+import subprocess
+import tracemalloc
 import zipfile
 from email.parser import Parser
 from io import StringIO
+from pathlib import Path
 
 from cleo.io.null_io import NullIO
 from cleo.testers.command_tester import CommandTester
 from poetry.console.application import Application
 from poetry.factory import Factory
-from poetry_plugin_freeze.app import IcedPoet, get_sha256_digest, project_roots
+from poetry.utils.env import EnvManager
+from poetry_plugin_export import walker
+import pytest
+from poetry_plugin_freeze.app import project_roots
+from poetry_plugin_freeze.apply import main as apply_main
+from poetry_plugin_freeze import freeze
+from poetry_plugin_freeze.cache import PlanCache
+from poetry_plugin_freeze.freeze import Fridge, IcedPoet, ProjectSummary, get_sha256_digest
+from poetry_plugin_freeze.plan import FreezePlan, read_plan_file
 
 
 def test_project_roots(fixture_root):
@@ -42,13 +58,18 @@ def test_freeze_command_options(fixture_root, monkeypatch):
     def mock_check(self):
         poet_options["wheel_dir"] = self.wheel_dir
         poet_options["exclude_packages"] = self.exclude_packages
+        poet_options["in_place"] = self.in_place
         return True
 
-    def mock_freeze(self):
-        return []
+    def mock_get_wheels(self):
+        return iter(())
+
+    def mock_env(self):
+        raise AssertionError("environment probed")
 
     monkeypatch.setattr(IcedPoet, "check", mock_check)
-    monkeypatch.setattr(IcedPoet, "freeze", mock_freeze)
+    monkeypatch.setattr(IcedPoet, "get_wheels", mock_get_wheels)
+    monkeypatch.setattr(EnvManager, "get", mock_env)
 
     poetry = Factory().create_poetry(fixture_root)
     app = Application()
@@ -58,13 +79,15 @@ def test_freeze_command_options(fixture_root, monkeypatch):
     cmd = app.find("freeze-wheel")
     tester = CommandTester(cmd)
 
-    tester.execute("--exclude boto3 -e attrs --wheel-dir mydir")
+    tester.execute("--exclude boto3 -e attrs --wheel-dir mydir --in-place")
     assert poet_options["wheel_dir"] == "mydir"
     assert poet_options["exclude_packages"] == ["boto3", "attrs"]
+    assert poet_options["in_place"] is True
 
     tester.execute()
     assert poet_options["wheel_dir"] == "dist"
     assert poet_options["exclude_packages"] == []
+    assert poet_options["in_place"] is False
 
     assert re.match("skipping.*non_poetry_package", cmd.io.fetch_error())
 
@@ -319,3 +342,762 @@ def test_freeze_exclude_packages(fixture_root, fixture_copy):
         ("tomli", "(==2.0.1)"),
     ]:
         assert expected_version_constraint in md_requirements[package]
+
+
+def test_freeze_copies_unchanged_members(fixture_root, fixture_copy, raw_member_bytes):
+    package = fixture_copy(fixture_root / "nested_packages")
+    source_whl = zipfile.ZipFile(package / "dist" / "app_b-0.1-py3-none-any.whl")
+    source_members = {
+        info.filename: (info, raw_member_bytes(source_whl, info)) for info in source_whl.infolist()
+    }
+    source_whl.close()
+
+    iced_pkg = IcedPoet(package)
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+    (wheel_path,) = iced_pkg.freeze()
+
+    frozen_whl = zipfile.ZipFile(wheel_path)
+    assert frozen_whl.testzip() is None
+    for name in ("app_b/__init__.py", "app_b-0.1.dist-info/WHEEL"):
+        orig_info, orig_raw = source_members[name]
+        info = frozen_whl.getinfo(name)
+        assert info.compress_type == orig_info.compress_type
+        assert info.CRC == orig_info.CRC
+        assert info.date_time == orig_info.date_time
+        assert info.external_attr == orig_info.external_attr
+        assert raw_member_bytes(frozen_whl, info) == orig_raw
+
+
+def test_freeze_in_place(fixture_root, fixture_copy):
+    package = fixture_copy(fixture_root / "nested_packages")
+    source_wheel = fixture_root / "nested_packages" / "dist" / "app_b-0.1-py3-none-any.whl"
+
+    iced_pkg = IcedPoet(package)
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+    (wheel_path,) = iced_pkg.freeze()
+    rewritten = wheel_path.read_bytes()
+
+    shutil.copy(source_wheel, wheel_path)
+    iced_pkg = IcedPoet(package, in_place=True)
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+    assert iced_pkg.freeze() == [wheel_path]
+
+    # the dist-info trails the package contents, so patching the wheel
+    # in place lays out the same archive a full rewrite does.
+    assert wheel_path.read_bytes() == rewritten
+    assert zipfile.ZipFile(wheel_path).testzip() is None
+
+
+def test_freeze_parallel(fixture_root, tmp_path, monkeypatch, run_freeze_command):
+    results = {}
+    for mode, args in (("serial", ""), ("parallel", "--jobs 2")):
+        package = tmp_path / mode
+        shutil.copytree(fixture_root / "nested_packages", package)
+        monkeypatch.chdir(package)
+        status, output, error = run_freeze_command(package, args)
+        assert status == 0
+        assert error == ""
+        metadata = {}
+        for w in sorted(package.rglob("*.whl")):
+            md_path = w.name.replace("-py3-none-any.whl", ".dist-info/METADATA")
+            metadata[w.relative_to(package)] = zipfile.ZipFile(w).read(md_path)
+        results[mode] = (output.replace(str(package), "<root>"), metadata)
+
+    assert results["serial"][0].count("froze ") == 4
+    assert results["serial"][0].endswith("4 frozen, 0 skipped, 0 failed\n")
+    assert results["parallel"] == results["serial"]
+
+
+def test_freeze_parallel_invalid_jobs(fixture_root, monkeypatch, run_freeze_command):
+    monkeypatch.chdir(fixture_root / "non_poetry_package")
+    status, _, error = run_freeze_command(fixture_root, "--jobs nope")
+    assert status == 1
+    assert "invalid --jobs value" in error
+
+
+def test_freeze_explicit_projects(fixture_root, fixture_copy, monkeypatch, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    status, output, error = run_freeze_command(package, "--projects others/app_*")
+    assert status == 0
+    assert error == ""
+    assert [line.split()[1] for line in output.splitlines()[1:-1]] == [
+        "app-c",
+        "app-no-deps",
+        "app-with-extras",
+    ]
+
+    (package / "pyproject.toml").write_text(
+        (package / "pyproject.toml").read_text() + '\n[tool.freeze]\nprojects = ["."]\n'
+    )
+    status, output, error = run_freeze_command(package)
+    assert [line.split()[1] for line in output.splitlines()[1:-1]] == ["app-b"]
+
+
+@pytest.mark.parametrize("jobs", ["", "--jobs 2"])
+def test_freeze_stale_lock(fixture_root, fixture_copy, monkeypatch, run_freeze_command, jobs):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    pyproject = package / "others" / "app_no_deps" / "pyproject.toml"
+    pyproject.write_text(
+        pyproject.read_text().replace(
+            "[tool.poetry.dependencies]", '[tool.poetry.dependencies]\nattrs = "*"'
+        )
+    )
+    (package / "others" / "app_c" / "poetry.lock").unlink()
+
+    # the other projects are still frozen, the run fails
+    status, output, error = run_freeze_command(package, jobs)
+    assert status == 1
+    assert output.endswith("2 frozen, 0 skipped, 2 failed\n")
+    assert f"poetry.lock in {package}/others/app_no_deps is out of date" in error
+    assert f"no poetry.lock in {package}/others/app_c" in error
+
+    status, output, _ = run_freeze_command(package, f"--check {jobs}")
+    assert status == 1
+    assert output.endswith("2 ok, 0 drifted, 2 failed\n")
+
+    status, _, error = run_freeze_command(package, f"--emit-plan plan.json {jobs}")
+    assert status == 1
+    assert "2 project(s) failed to plan" in error
+
+
+@pytest.mark.parametrize("args", ["--incremental", "--incremental --jobs 2"])
+def test_freeze_incremental(fixture_root, fixture_copy, monkeypatch, args, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    status, output, _ = run_freeze_command(package, args)
+    assert status == 0
+    assert output.endswith("4 frozen, 0 skipped, 0 failed\n")
+    contents = {w: w.read_bytes() for w in package.rglob("*.whl")}
+
+    status, output, _ = run_freeze_command(package, args)
+    assert status == 0
+    assert output.count("(already frozen)") == 4
+    assert output.endswith("0 frozen, 4 skipped, 0 failed\n")
+    assert {w: w.read_bytes() for w in package.rglob("*.whl")} == contents
+
+    # without --incremental wheels are always rewritten
+    status, output, _ = run_freeze_command(package, args.replace("--incremental", ""))
+    assert output.endswith("4 frozen, 0 skipped, 0 failed\n")
+
+
+def test_freeze_reuses_fridge_projects(fixture_root, fixture_copy, monkeypatch):
+    package = fixture_copy(fixture_root / "nested_packages")
+    iced_b = IcedPoet(package)
+    iced_c = IcedPoet(package / "others" / "app_c")
+    iced_pkg = IcedPoet(package / "others" / "app_with_extras")
+    fridge = Fridge([iced_b, iced_c, iced_pkg])
+    iced_pkg.set_fridge(fridge)
+
+    loaded = []
+    create_poetry = IcedPoet.factory.create_poetry
+
+    def mock_create_poetry(project_dir, *args, **kw):
+        loaded.append(project_dir)
+        return create_poetry(project_dir, *args, **kw)
+
+    monkeypatch.setattr(IcedPoet.factory, "create_poetry", mock_create_poetry)
+
+    path_deps = list(iced_pkg.get_path_deps("main"))
+    assert sorted(str(d.package.name) for d in path_deps) == ["app-b", "app-c"]
+    assert iced_pkg.freeze() and iced_pkg.freeze()
+    assert loaded == []
+
+    # path dependencies outside the fridge are loaded once and kept
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+    list(iced_pkg.get_path_deps("main"))
+    list(iced_pkg.get_path_deps("main"))
+    assert sorted(p.name for p in loaded) == ["app_c", "nested_packages"]
+
+
+def test_freeze_streams_projects(fixture_root, fixture_copy, monkeypatch, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    events = []
+    create_poetry = IcedPoet.factory.create_poetry
+    freeze_wheel = IcedPoet.freeze_wheel
+
+    def mock_create_poetry(project_dir, *args, **kw):
+        events.append(("load", Path(project_dir).name))
+        return create_poetry(project_dir, *args, **kw)
+
+    def mock_freeze_wheel(self, wheel_path, plan, *args):
+        events.append(("freeze", str(self.name)))
+        return freeze_wheel(self, wheel_path, plan, *args)
+
+    monkeypatch.setattr(IcedPoet.factory, "create_poetry", mock_create_poetry)
+    monkeypatch.setattr(IcedPoet, "freeze_wheel", mock_freeze_wheel)
+
+    status, _, _ = run_freeze_command(
+        package, "--projects others/app_with_extras --projects others/app_c --projects ."
+    )
+    assert status == 0
+    # the first project is frozen before the next one is discovered, its
+    # path dependencies are loaded on demand and frozen without being
+    # loaded again when they're discovered themselves.
+    assert events == [
+        ("load", "app_with_extras"),
+        ("load", "app_c"),
+        ("load", "nested_packages"),
+        ("freeze", "app-with-extras"),
+        ("freeze", "app-c"),
+        ("freeze", "app-b"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "args, kept",
+    [
+        ("--projects others/app_with_extras --projects others/app_c", ["app_c"]),
+        ("--projects others/app_with_extras", []),
+        ("--exclude-path others/app_c", []),
+        ("--changed-since HEAD", []),
+    ],
+)
+def test_freeze_releases_unclaimed_projects(
+    fixture_root, fixture_copy, monkeypatch, run_freeze_command, args, kept
+):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    for command in (["init", "-q"], ["add", "-A"], ["commit", "-q", "-m", "initial"]):
+        subprocess.run(git + command, cwd=package, check=True, capture_output=True)
+    (package / "others" / "app_with_extras" / "README.md").write_text("changed\n")
+
+    fridges = []
+    freeze_wheel = IcedPoet.freeze_wheel
+
+    def mock_freeze_wheel(self, wheel_path, plan, *args):
+        if self.name == "app-with-extras":
+            # only path dependencies which may still be discovered are kept loaded
+            fridges.append(sorted(p.name for p in self.fridge.unclaimed))
+            fridges.append(self.fridge)
+        return freeze_wheel(self, wheel_path, plan, *args)
+
+    monkeypatch.setattr(IcedPoet, "freeze_wheel", mock_freeze_wheel)
+    status, _, _ = run_freeze_command(package, args)
+    assert status == 0
+    unclaimed, fridge = fridges
+    assert unclaimed == kept
+    assert fridge.unclaimed == {}
+
+
+def test_fridge_hands_over_path_deps(fixture_root):
+    fridge = Fridge()
+    project_dir = fixture_root / "nested_packages" / "others" / "app_c"
+    summary = fridge.get_project(project_dir / ".." / "app_c")
+    iced = fridge.load(project_dir)
+    assert iced.name == summary.name
+    assert iced.project_dir == project_dir
+    # claimed projects are left to the caller, the fridge keeps their summary
+    assert fridge.unclaimed == {}
+    assert isinstance(fridge["app-c"], ProjectSummary)
+
+
+def test_fridge_holds_summaries(fixture_root):
+    iced_pkg = IcedPoet(fixture_root / "nested_packages" / "others" / "app_with_extras")
+    fridge = Fridge([iced_pkg])
+    iced_pkg.set_fridge(fridge)
+    list(iced_pkg.get_path_deps("main"))
+
+    summaries = [fridge["app-with-extras"]] + list(fridge.by_path.values())
+    assert all(isinstance(s, ProjectSummary) for s in summaries)
+    assert not hasattr(summaries[0], "__dict__")
+    assert sorted(str(s.name) for s in fridge.by_path.values()) == [
+        "app-b",
+        "app-c",
+        "app-with-extras",
+    ]
+
+    # the plan is unchanged by resolving path dependencies from summaries
+    summary = fridge.get_project(fixture_root / "nested_packages" / "others" / "app_c")
+    iced_c = IcedPoet(fixture_root / "nested_packages" / "others" / "app_c")
+    assert summary.distro_name == iced_c.distro_name
+    assert (
+        summary.to_package().to_dependency().to_pep_508()
+        == iced_c.poetry.package.to_dependency().to_pep_508()
+    )
+
+
+def test_freeze_plan_is_side_effect_free(fixture_root):
+    iced_pkg = IcedPoet(fixture_root / "nested_packages" / "others" / "app_with_extras")
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+    requires = iced_pkg.poetry.package.requires
+    markers = [(dep.name, str(dep.marker), list(dep.in_extras)) for dep in requires]
+
+    plan = iced_pkg.get_freeze_plan()
+    assert plan.name == "app-with-extras"
+    assert plan.dist_info == "app_with_extras-0.1.0.dist-info"
+    assert any(line.startswith("app-c (==0.2)") for line in plan.requires_dist)
+
+    assert iced_pkg.get_freeze_plan() == plan
+    assert [(dep.name, str(dep.marker), list(dep.in_extras)) for dep in requires] == markers
+    assert pickle.loads(pickle.dumps(plan)) == plan
+
+
+def test_freeze_loads_lock_once(fixture_root, fixture_copy, monkeypatch):
+    package = fixture_copy(fixture_root / "nested_packages")
+    iced_pkg = IcedPoet(package / "others" / "app_with_extras")
+    iced_pkg.set_fridge({iced_pkg.name: iced_pkg})
+
+    locker = iced_pkg.poetry.locker
+    calls = []
+    locked_repository = locker.locked_repository
+
+    def mock_locked_repository():
+        calls.append(1)
+        return locked_repository()
+
+    monkeypatch.setattr(locker, "locked_repository", mock_locked_repository)
+
+    assert iced_pkg.freeze()
+    assert len(calls) == 1
+
+    index = iced_pkg.lock_index
+    assert [str(p.version) for p in index.packages_by_name["ruff"]] == ["0.0.259"]
+    assert index.region_markers["coverage"]
+
+
+def write_extras_project(path, extras, chain):
+    """A project where every extra pulls in the same chain of locked packages."""
+    path.mkdir()
+    deps = "\n".join(f'extra-{i} = {{version = "*", optional = true}}' for i in range(extras))
+    extra_groups = "\n".join(f'e{i} = ["extra-{i}"]' for i in range(extras))
+    (path / "pyproject.toml").write_text(
+        f"""[tool.poetry]
+name = "app-extras"
+version = "0.1"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.10"
+{deps}
+
+[tool.poetry.extras]
+{extra_groups}
+"""
+    )
+
+    packages = []
+    for i in range(extras):
+        packages.append((f"extra-{i}", "shared-0"))
+    for i in range(chain):
+        packages.append((f"shared-{i}", f"shared-{i + 1}" if i + 1 < chain else None))
+    lock = []
+    for name, dep in packages:
+        lock.append(
+            f'[[package]]\nname = "{name}"\nversion = "1.0"\ndescription = ""\n'
+            f'optional = true\npython-versions = "*"\nfiles = []\n'
+        )
+        if dep:
+            lock.append(f'[package.dependencies]\n{dep} = "*"\n')
+    lock.append("[extras]\n" + extra_groups + "\n")
+    lock.append('[metadata]\nlock-version = "2.0"\npython-versions = "^3.10"\ncontent-hash = "0"\n')
+    (path / "poetry.lock").write_text("\n".join(lock))
+    return path
+
+
+def test_dependency_sources_single_walk(tmp_path, monkeypatch):
+    expanded = []
+    get_locked_package = freeze.get_locked_package
+
+    def mock_get_locked_package(requirement, *args):
+        expanded.append(requirement.name)
+        return get_locked_package(requirement, *args)
+
+    monkeypatch.setattr(freeze, "get_locked_package", mock_get_locked_package)
+
+    walks = {}
+    for extras in (1, 16):
+        expanded.clear()
+        iced = IcedPoet(write_extras_project(tmp_path / f"extras_{extras}", extras, chain=20))
+        sources = iced.get_dependency_sources()
+        assert sources["shared-19"] == {f"e{i}" for i in range(extras)}
+        assert sources["extra-0"] == {"e0"}
+        walks[extras] = len(expanded)
+
+    # each extra only adds the expansion of its own package, the shared
+    # chain is walked once however many extras reach it.
+    assert walks[1] == 21
+    assert walks[16] == walks[1] + 15
+
+
+@pytest.mark.parametrize("project", ["nested_packages", "nested_packages/others/app_with_extras"])
+def test_dep_packages_use_lock_index(fixture_root, monkeypatch, project):
+    iced = IcedPoet(fixture_root / project)
+    iced.set_fridge(Fridge([iced]))
+    index = iced.lock_index
+    roots = []
+    walk_dependency_labels = freeze.walk_dependency_labels
+
+    def mock_walk(requirements, *args):
+        roots.extend(r for r, _ in requirements)
+        return walk_dependency_labels(requirements, *args)
+
+    def no_regions(packages):
+        raise AssertionError("python version regions recomputed")
+
+    with monkeypatch.context() as m:
+        m.setattr(freeze, "walk_dependency_labels", mock_walk)
+        m.setattr(walker, "get_python_version_region_markers", no_regions)
+        dep_packages = iced.get_dep_packages()
+
+    # the same packages, reached as the same requirements, as export's walk
+    expected = walker.walk_dependencies(
+        list(roots), index.packages_by_name, iced.poetry.package.name
+    )
+    assert len(dep_packages) > 1
+    assert [(p.package, p.dependency, str(p.dependency.marker)) for p in dep_packages] == [
+        (package, dependency, str(dependency.marker)) for package, dependency in expected.items()
+    ]
+
+
+def test_freeze_plan_cache(fixture_root, fixture_copy, tmp_path, monkeypatch):
+    package = fixture_copy(fixture_root / "nested_packages")
+    cache = PlanCache(tmp_path / "plans")
+
+    iced_pkg = IcedPoet(package / "others" / "app_with_extras", plan_cache=cache)
+    plan = iced_pkg.get_freeze_plan()
+    assert len(os.listdir(tmp_path / "plans")) == 1
+
+    def no_walk(self):
+        raise AssertionError("dependency walk on a warm cache")
+
+    with monkeypatch.context() as m:
+        m.setattr(IcedPoet, "get_dep_packages", no_walk)
+        m.setattr(IcedPoet, "get_dependency_sources", no_walk)
+        iced_pkg = IcedPoet(package / "others" / "app_with_extras", plan_cache=cache)
+        assert iced_pkg.get_freeze_plan() == plan
+        assert iced_pkg.freeze()
+
+    # changes to what the plan depends on resolve a new plan
+    keys = {iced_pkg.get_plan_key()}
+    iced_pkg.exclude_packages = ["ruff"]
+    keys.add(iced_pkg.get_plan_key())
+    iced_pkg.exclude_packages = ()
+    app_c = package / "others" / "app_c" / "pyproject.toml"
+    app_c.write_text(app_c.read_text().replace('version = "0.2"', 'version = "0.3"'))
+    keys.add(iced_pkg.get_plan_key())
+    # as do upgrades of the code resolving plans
+    monkeypatch.setattr(freeze, "plan_distribution_versions", lambda: "poetry-plugin-export==9")
+    keys.add(iced_pkg.get_plan_key())
+    assert len(keys) == 4
+
+
+def test_freeze_command_plan_cache(
+    fixture_root, fixture_copy, poetry_cache_dir, monkeypatch, run_freeze_command
+):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+
+    status, _, _ = run_freeze_command(package, "--no-cache")
+    assert status == 0
+    assert not (poetry_cache_dir / "freeze-plans").exists()
+
+    status, _, _ = run_freeze_command(package)
+    assert status == 0
+    assert len(os.listdir(poetry_cache_dir / "freeze-plans")) == 4
+
+
+def wheel_contents(root):
+    return {w.relative_to(root): w.read_bytes() for w in sorted(root.rglob("*.whl"))}
+
+
+@pytest.mark.parametrize("args", ["", "--jobs 2"])
+def test_freeze_emit_and_apply_plan(fixture_root, tmp_path, monkeypatch, args, run_freeze_command):
+    frozen = tmp_path / "frozen"
+    shutil.copytree(fixture_root / "nested_packages", frozen)
+    monkeypatch.chdir(frozen)
+    assert run_freeze_command(frozen)[0] == 0
+
+    package = tmp_path / "package"
+    shutil.copytree(fixture_root / "nested_packages", package)
+    monkeypatch.chdir(package)
+    built = wheel_contents(package)
+    plan_file = tmp_path / "plan.json"
+    status, output, error = run_freeze_command(package, f"--emit-plan {plan_file} {args}")
+    assert status == 0
+    assert error == ""
+    assert output.splitlines()[-1] == f"wrote 4 plan(s) to {plan_file}"
+    # emitting a plan leaves the wheels alone
+    assert wheel_contents(package) == built
+
+    projects = read_plan_file(plan_file)
+    assert [(str(path), plan.name) for path, plan in projects] == [
+        (".", "app-b"),
+        ("others/app_c", "app-c"),
+        ("others/app_no_deps", "app-no-deps"),
+        ("others/app_with_extras", "app-with-extras"),
+    ]
+
+    status, output, error = run_freeze_command(package, f"--apply-plan {plan_file}")
+    assert status == 0
+    assert output.endswith("4 frozen, 0 skipped, 0 failed\n")
+    assert wheel_contents(package) == wheel_contents(frozen)
+
+
+def test_apply_plan_standalone(
+    fixture_root, fixture_copy, tmp_path, monkeypatch, capsys, run_freeze_command
+):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    plan_file = tmp_path / "plan.json"
+    assert run_freeze_command(package, f"--emit-plan {plan_file}")[0] == 0
+
+    # wheels gathered from several build jobs into one directory
+    wheelhouse = tmp_path / "wheelhouse"
+    wheelhouse.mkdir()
+    for w in package.rglob("*.whl"):
+        shutil.copy(w, wheelhouse)
+    (wheelhouse / "other-1.0-py3-none-any.whl").write_bytes(b"")
+
+    assert apply_main([str(plan_file), str(wheelhouse)]) == 0
+    assert capsys.readouterr().out.endswith("4 frozen, 0 skipped\n")
+    assert apply_main([str(plan_file), str(wheelhouse), "--incremental"]) == 0
+    assert capsys.readouterr().out.endswith("0 frozen, 4 skipped\n")
+
+    assert apply_main([str(plan_file), "--root", str(package)]) == 0
+    assert capsys.readouterr().out.endswith("4 frozen, 0 skipped\n")
+    assert {w.name: w.read_bytes() for w in package.rglob("*.whl")} == {
+        w.name: w.read_bytes() for w in wheelhouse.glob("app*.whl")
+    }
+
+
+def replace_record_line(wheel_path, member, line):
+    """Rewrite a wheel with member's line in RECORD replaced."""
+    with zipfile.ZipFile(wheel_path) as whl:
+        members = [(info, whl.read(info)) for info in whl.infolist()]
+    with zipfile.ZipFile(wheel_path, "w") as whl:
+        for info, data in members:
+            if info.filename.endswith(".dist-info/RECORD"):
+                rows = data.decode().splitlines()
+                data = "".join(
+                    (line if r.startswith(member + ",") else r) + "\n" for r in rows
+                ).encode()
+            whl.writestr(info, data)
+
+
+@pytest.mark.parametrize("args", ["", "--jobs 2"])
+def test_freeze_check(fixture_root, fixture_copy, monkeypatch, args, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    built = wheel_contents(package)
+
+    status, output, _ = run_freeze_command(package, f"--check {args}")
+    assert status == 1
+    # app_no_deps has no requirements to freeze
+    assert output.endswith("1 ok, 3 drifted, 0 failed\n")
+    assert (
+        f"drifted app-c 0.2 -> {package}/others/app_c/dist/app_c-0.2-py3-none-any.whl\n" in output
+    )
+    assert "  unexpected Requires-Dist: pytest (>=7.1,<8.0)\n" in output
+    assert (
+        '  missing Requires-Dist: pytest (==7.2.2) ; python_version >= "3.10"'
+        ' and python_version < "4.0"\n'
+    ) in output
+    # checking never writes wheels
+    assert wheel_contents(package) == built
+
+    assert run_freeze_command(package, args)[0] == 0
+    status, output, _ = run_freeze_command(package, f"--check {args}")
+    assert status == 0
+    assert output.count("\nok ") == 4
+    assert output.endswith("4 ok, 0 drifted, 0 failed\n")
+
+    # a frozen wheel whose RECORD no longer matches its METADATA
+    w = package / "others" / "app_c" / "dist" / "app_c-0.2-py3-none-any.whl"
+    md_path = "app_c-0.2.dist-info/METADATA"
+    replace_record_line(w, md_path, f"{md_path},sha256=AAAA,1")
+    status, output, _ = run_freeze_command(package, f"--check {args}")
+    assert status == 1
+    assert f"drifted app-c 0.2 -> {w}\n  RECORD hash of {md_path} doesn't match" in output
+    assert output.endswith("3 ok, 1 drifted, 0 failed\n")
+
+
+def test_check_plan(fixture_root, fixture_copy, tmp_path, monkeypatch, capsys, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    plan_file = tmp_path / "plan.json"
+    assert run_freeze_command(package, f"--emit-plan {plan_file}")[0] == 0
+
+    status, output, _ = run_freeze_command(package, f"--apply-plan {plan_file} --check")
+    assert status == 1
+    assert output.endswith("1 ok, 3 drifted, 0 failed\n")
+    assert apply_main([str(plan_file), "--check"]) == 1
+    assert capsys.readouterr().out.endswith("1 ok, 3 drifted\n")
+
+    assert run_freeze_command(package, f"--apply-plan {plan_file}")[0] == 0
+    status, output, _ = run_freeze_command(package, f"--apply-plan {plan_file} --check")
+    assert status == 0
+    assert output.endswith("4 ok, 0 drifted, 0 failed\n")
+    assert apply_main([str(plan_file), "--check"]) == 0
+    assert capsys.readouterr().out.endswith("4 ok, 0 drifted\n")
+
+
+def assert_manifests(package, count):
+    manifests = sorted(package.rglob("manifest.json"))
+    assert sum(len(json.loads(m.read_text())["wheels"]) for m in manifests) == count
+    for manifest in manifests:
+        wheels = json.loads(manifest.read_text())["wheels"]
+        sums = (manifest.parent / "SHA256SUMS").read_text().splitlines()
+        assert sums == [f"{wheels[name]['sha256']}  {name}" for name in sorted(wheels)]
+        for name, entry in wheels.items():
+            content = (manifest.parent / name).read_bytes()
+            assert entry == {
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "blake2_256": hashlib.blake2b(content, digest_size=32).hexdigest(),
+            }
+
+
+@pytest.mark.parametrize("args", ["", "--jobs 2", "--in-place"])
+def test_freeze_manifest(fixture_root, fixture_copy, monkeypatch, args, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    status, output, _ = run_freeze_command(package, f"--manifest {args}")
+    assert status == 0
+    assert f"wrote {package}/dist/SHA256SUMS\n" in output
+    assert_manifests(package, 4)
+
+    # wheels which are skipped are listed too
+    status, output, _ = run_freeze_command(package, f"--manifest --incremental {args}")
+    assert output.endswith("0 frozen, 4 skipped, 0 failed\n")
+    assert_manifests(package, 4)
+
+
+def test_apply_plan_manifest(fixture_root, fixture_copy, tmp_path, monkeypatch, run_freeze_command):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    plan_file = tmp_path / "plan.json"
+    assert run_freeze_command(package, f"--emit-plan {plan_file}")[0] == 0
+
+    wheelhouse = tmp_path / "wheelhouse"
+    wheelhouse.mkdir()
+    for w in package.rglob("*.whl"):
+        shutil.copy(w, wheelhouse)
+    assert apply_main([str(plan_file), str(wheelhouse), "--manifest"]) == 0
+    assert_manifests(wheelhouse, 4)
+
+    status, _, _ = run_freeze_command(package, f"--apply-plan {plan_file} --manifest")
+    assert status == 0
+    assert_manifests(package, 4)
+
+
+@pytest.mark.parametrize("args", ["", "--jobs 2", "--in-place"])
+def test_freeze_output_dir(fixture_root, tmp_path, monkeypatch, args, run_freeze_command):
+    frozen = tmp_path / "frozen"
+    shutil.copytree(fixture_root / "nested_packages", frozen)
+    monkeypatch.chdir(frozen)
+    assert run_freeze_command(frozen)[0] == 0
+
+    package = tmp_path / "package"
+    shutil.copytree(fixture_root / "nested_packages", package)
+    monkeypatch.chdir(package)
+    built = wheel_contents(package)
+    output_dir = tmp_path / "wheelhouse"
+    status, output, _ = run_freeze_command(package, f"--output-dir {output_dir} --manifest {args}")
+    assert status == 0
+    assert f"froze app-c 0.2 -> {output_dir}/app_c-0.2-py3-none-any.whl\n" in output
+    assert wheel_contents(package) == built
+    assert {w.name: c for w, c in wheel_contents(output_dir).items()} == {
+        w.name: c for w, c in wheel_contents(frozen).items()
+    }
+    assert_manifests(output_dir, 4)
+
+    # checking looks at the frozen copies, not the built wheels
+    status, output, _ = run_freeze_command(package, f"--check --output-dir {output_dir} {args}")
+    assert status == 0
+    assert output.endswith("4 ok, 0 drifted, 0 failed\n")
+    status, output, _ = run_freeze_command(package, f"--check --output-dir {tmp_path / 'empty'}")
+    assert status == 1
+    assert f"  missing from {tmp_path / 'empty'}\n" in output
+    assert output.endswith("0 ok, 4 drifted, 0 failed\n")
+
+    # built wheels which are already frozen are copied as they are
+    monkeypatch.chdir(frozen)
+    status, output, _ = run_freeze_command(frozen, f"--output-dir {output_dir} --incremental")
+    assert output.endswith("0 frozen, 4 skipped, 0 failed\n")
+    assert {w.name: c for w, c in wheel_contents(output_dir).items()} == {
+        w.name: c for w, c in wheel_contents(frozen).items()
+    }
+
+
+def test_apply_plan_output_dir(
+    fixture_root, fixture_copy, tmp_path, monkeypatch, run_freeze_command
+):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    plan_file = tmp_path / "plan.json"
+    assert run_freeze_command(package, f"--emit-plan {plan_file}")[0] == 0
+    built = wheel_contents(package)
+
+    output_dir = tmp_path / "frozen"
+    assert apply_main([str(plan_file), "--output-dir", str(output_dir)]) == 0
+    assert wheel_contents(package) == built
+    assert len(wheel_contents(output_dir)) == 4
+
+    assert apply_main([str(plan_file), "--check", "--output-dir", str(output_dir)]) == 0
+    status, output, _ = run_freeze_command(
+        package, f"--apply-plan {plan_file} --check --output-dir {output_dir}"
+    )
+    assert status == 0
+    assert output.endswith("4 ok, 0 drifted, 0 failed\n")
+
+
+@pytest.mark.parametrize("in_place", [False, True])
+def test_freeze_large_record(tmp_path, in_place):
+    dist_info = "pkg-1.0.dist-info"
+    record = "".join(f"pkg/module_{i:06d}.py,sha256={'a' * 43},{i}\n" for i in range(50000))
+    record += f"{dist_info}/METADATA,,\n{dist_info}/RECORD,,\n"
+    wheel = tmp_path / "pkg-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("pkg/__init__.py", "")
+        zf.writestr(f"{dist_info}/METADATA", "Name: pkg\nVersion: 1.0\nRequires-Dist: attrs\n")
+        zf.writestr(f"{dist_info}/RECORD", record)
+    plan = FreezePlan("pkg", "1.0", dist_info, ("attrs (==22.2.0)",))
+
+    tracemalloc.start()
+    try:
+        assert plan.freeze_wheel(wheel, in_place=in_place)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if not in_place:
+        # a rewrite streams the record, patching in place holds it whole
+        assert peak < len(record) // 2
+
+    assert plan.check_wheel(wheel) == []
+    with zipfile.ZipFile(wheel) as zf:
+        lines = zf.read(f"{dist_info}/RECORD").decode().splitlines()
+    assert lines[:-1] == record.splitlines()[:50000] + [f"{dist_info}/RECORD,,"]
+    assert lines[-1].startswith(f"{dist_info}/METADATA,sha256=")
+
+
+@pytest.mark.parametrize("args", ["", "--jobs 2"])
+def test_freeze_timings_report(
+    fixture_root, fixture_copy, tmp_path, monkeypatch, args, run_freeze_command
+):
+    package = fixture_copy(fixture_root / "nested_packages")
+    monkeypatch.chdir(package)
+    report_file = tmp_path / "report.json"
+    profile_file = tmp_path / "freeze.prof"
+    status, output, _ = run_freeze_command(
+        package, f"--timings --report {report_file} --profile {profile_file} {args}"
+    )
+    assert status == 0
+    assert "discover " in output
+    assert profile_file.stat().st_size > 0
+
+    report = json.loads(report_file.read_text())
+    assert sorted(report["phases"]) == ["discover", "freeze", "load", "plan"]
+    assert sorted(report["projects"]) == ["app-b", "app-c", "app-no-deps", "app-with-extras"]
+    assert sorted(report["projects"]["app-c"]) == ["freeze", "load", "plan"]
+    assert len(report["wheels"]) == 4
+    for record in report["wheels"]:
+        assert record["written"] is True
+        assert record["input_size"] > 0 and record["output_size"] > 0
+        assert record["bytes_read"] > 0 and record["bytes_written"] >= record["output_size"]
+        assert record["members"] > 0
+        assert record["compression_ratio"] > 0
@@ -0,0 +1,75 @@
+from poetry.factory import Factory
+from poetry.poetry import Poetry
+import pytest
+
+from poetry_plugin_freeze import loader
+from poetry_plugin_freeze.freeze import IcedPoet
+from poetry_plugin_freeze.loader import ProjectFactory, ProjectPoetry, PyProjectError
+
+PROJECTS = [
+    "nested_packages",
+    "nested_packages/others/app_c",
+    "nested_packages/others/app_no_deps",
+    "nested_packages/others/app_with_extras",
+]
+
+
+@pytest.mark.skipif(not loader.LIGHT_LOADING, reason="poetry-core 1.x uses the Factory")
+@pytest.mark.parametrize("project", PROJECTS)
+def test_light_load_matches_factory(fixture_root, project):
+    project_dir = fixture_root / project
+    light = ProjectFactory().create_light(project_dir)
+    full = Factory().create_poetry(project_dir)
+    assert isinstance(light, ProjectPoetry)
+
+    assert light.package.name == full.package.name
+    assert light.package.version == full.package.version
+    assert light.package.python_versions == full.package.python_versions
+    assert light.package.extras == full.package.extras
+    assert light.package.all_requires == full.package.all_requires
+    for left, right in zip(light.package.all_requires, full.package.all_requires):
+        assert left.to_pep_508() == right.to_pep_508()
+    assert light.package.dependency_group_names() == full.package.dependency_group_names()
+    assert light.locker.is_fresh() == full.locker.is_fresh()
+    assert light.locker.lock_data == full.locker.lock_data
+
+
+@pytest.mark.parametrize("project", PROJECTS)
+def test_light_load_same_plan(fixture_root, project, monkeypatch):
+    light = IcedPoet(fixture_root / project).get_freeze_plan()
+    monkeypatch.setattr(IcedPoet, "factory", Factory())
+    assert IcedPoet(fixture_root / project).get_freeze_plan() == light
+
+
+@pytest.mark.parametrize(
+    "pyproject",
+    [
+        'requires-poetry = ">=2.0"\n',
+        'requires-plugins = {my-plugin = ">1"}\n',
+        "package-mode = false\n",
+    ],
+)
+def test_light_load_falls_back(fixture_root, fixture_copy, pyproject):
+    project_dir = fixture_copy(fixture_root / "nested_packages" / "others" / "app_no_deps")
+    path = project_dir / "pyproject.toml"
+    path.write_text(path.read_text().replace("[tool.poetry]\n", "[tool.poetry]\n" + pyproject))
+    assert ProjectFactory().create_light(project_dir) is None
+
+
+def test_light_load_falls_back_non_poetry(fixture_root):
+    assert ProjectFactory().create_light(fixture_root / "non_poetry_package") is None
+    with pytest.raises((PyProjectError, RuntimeError)):
+        ProjectFactory().create_poetry(fixture_root / "non_poetry_package")
+
+
+def test_light_load_needs_poetry_core_2(fixture_root, monkeypatch):
+    monkeypatch.setattr(loader, "LIGHT_LOADING", False)
+    project_dir = fixture_root / "nested_packages"
+    assert ProjectFactory().create_light(project_dir) is None
+    assert isinstance(ProjectFactory().create_poetry(project_dir), Poetry)
+
+
+def test_plugins_use_factory(fixture_root, monkeypatch):
+    monkeypatch.setattr(loader, "has_poetry_plugins", lambda: True)
+    poetry = ProjectFactory().create_poetry(fixture_root / "nested_packages")
+    assert isinstance(poetry, Poetry)
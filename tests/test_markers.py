@@ -0,0 +1,34 @@
+from poetry.core.constraints.version import parse_constraint
+from poetry.core.version.markers import parse_marker
+
+from poetry_plugin_freeze import markers
+
+
+def test_python_marker_memoized():
+    marker = markers.python_marker(parse_constraint("^3.10"))
+    assert str(marker) == 'python_version >= "3.10" and python_version < "4.0"'
+    assert markers.python_marker(parse_constraint(">=3.10,<4.0")) is marker
+
+
+def test_markers_interned():
+    marker = parse_marker('sys_platform == "win32"')
+    python = markers.python_marker(parse_constraint("^3.10"))
+    first = markers.intersect(marker, python)
+    # equal markers built separately resolve to the same instance
+    assert markers.intersect(parse_marker('sys_platform == "win32"'), python) is first
+    assert markers.intern_marker(marker.intersect(python)) is first
+    assert (
+        markers.without_extras(markers.multi_marker(first, markers.extras_marker(frozenset(["a"]))))
+        is first
+    )
+
+
+def test_extras_marker_order():
+    marker = markers.extras_marker(frozenset(["whistles", "bells"]))
+    assert str(marker) == 'extra == "bells" or extra == "whistles"'
+    assert markers.extras_marker(frozenset(["bells", "whistles"])) is marker
+
+
+def test_marker_caches_bounded():
+    for name, info in markers.cache_info().items():
+        assert info.maxsize is not None, name
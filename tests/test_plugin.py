@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+
+from poetry_plugin_freeze import app, freeze
+
+
+HEAVY_MODULES = [
+    "csv",
+    "zipfile",
+    "concurrent.futures.process",
+    "poetry.factory",
+    "poetry.core.masonry.metadata",
+    "poetry_plugin_export.walker",
+    "poetry_plugin_freeze.freeze",
+    "poetry_plugin_freeze.wheel",
+]
+
+PROBE = """
+import json, sys
+from poetry.console.commands.command import Command
+from poetry.plugins.application_plugin import ApplicationPlugin
+before = set(sys.modules)
+import poetry_plugin_freeze.app
+print(json.dumps(sorted(set(sys.modules) - before)))
+"""
+
+
+def test_plugin_import_is_light():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], check=True, capture_output=True, text=True
+    ).stdout
+    loaded = json.loads(output)
+    assert "poetry_plugin_freeze.app" in loaded
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
+
+
+APPLY_PROBE = """
+import json, sys
+import poetry_plugin_freeze.apply
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_apply_entry_point_is_standalone():
+    output = subprocess.run(
+        [sys.executable, "-c", APPLY_PROBE], check=True, capture_output=True, text=True
+    ).stdout
+    loaded = json.loads(output)
+    assert [
+        m for m in loaded if m.split(".")[0] in ("poetry", "cleo", "poetry_plugin_export")
+    ] == []
+
+
+def test_plugin_lazy_exports():
+    assert app.IcedPoet is freeze.IcedPoet
+    assert app.get_sha256_digest is freeze.get_sha256_digest
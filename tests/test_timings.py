@@ -0,0 +1,101 @@
+import os
+import pickle
+import zipfile
+
+from poetry_plugin_freeze.plan import FreezePlan
+from poetry_plugin_freeze.timings import Timings, run_timed, wheel_stats
+
+
+def test_timings_phases():
+    timings = Timings()
+    with timings.phase("discover"):
+        pass
+    with timings.phase("load") as load:
+        load.project = "app"
+    with timings.phase("plan", "app"):
+        sum(range(1000))
+
+    assert sorted(timings.phases) == ["discover", "load", "plan"]
+    assert sorted(timings.projects["app"]) == ["load", "plan"]
+    assert timings.projects["app"]["plan"]["wall"] == timings.phases["plan"]["wall"]
+    assert [line.split()[0] for line in timings.format_lines()] == [
+        "discover",
+        "load",
+        "plan",
+        "app",
+        "app",
+    ]
+
+
+def test_timings_disabled(tmp_path):
+    timings = Timings(enabled=False)
+    with timings.phase("load", "app"):
+        pass
+    assert timings.freeze_wheel("app", tmp_path / "missing.whl", lambda w: True) is True
+    assert timings.to_dict() == {"phases": {}, "projects": {}, "wheels": []}
+
+
+def test_timings_wheel_stats(tmp_path):
+    wheel = tmp_path / "app-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("app/__init__.py", b"x" * 1000)
+        zf.writestr("app-1.0.dist-info/METADATA", b"Name: app\n")
+
+    stats = wheel_stats(wheel)
+    assert stats["members"] == 2
+    assert stats["uncompressed_size"] == 1010
+    assert stats["compression_ratio"] > 1
+
+    size = wheel.stat().st_size
+    timings = Timings()
+    assert timings.freeze_wheel("app", wheel, lambda w: False) is False
+    [record] = timings.wheels
+    assert record["input_size"] == size
+    assert record["output_size"] == 0
+    assert record["members"] == 2
+
+
+def test_timings_count_io(tmp_path):
+    wheel = tmp_path / "app-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as zf:
+        zf.writestr("app/data.bin", os.urandom(256 * 1024))
+        zf.writestr("app-1.0.dist-info/METADATA", "Name: app\nRequires-Dist: attrs\n")
+        zf.writestr("app-1.0.dist-info/RECORD", "app/data.bin,,\n")
+    plan = FreezePlan("app", "1.0", "app-1.0.dist-info", ("attrs (==23.1.0)",))
+
+    timings = Timings()
+    # a rewrite reads and writes the whole wheel
+    timings.freeze_wheel("app", wheel, plan.freeze_wheel)
+    # patching in place only reads and writes the metadata at the end
+    timings.freeze_wheel("app", wheel, plan.freeze_wheel, True)
+    # an already frozen wheel is barely read
+    timings.freeze_wheel("app", wheel, plan.freeze_wheel, False, True)
+    rewrite, patch, skip = timings.wheels
+
+    size = wheel.stat().st_size
+    assert rewrite["bytes_read"] > size // 2 and rewrite["bytes_written"] >= size
+    assert 0 < patch["bytes_written"] < size // 10 and patch["bytes_read"] < size // 10
+    assert patch["output_size"] == size
+    assert skip["written"] is False
+    assert skip["bytes_written"] == 0 and 0 < skip["bytes_read"] < size // 10
+
+
+def plan(name, timings):
+    with timings.phase("plan", name):
+        return name.upper()
+
+
+def test_timings_merge_worker():
+    result, worker = run_timed(plan, True, "app")
+    assert result == "APP"
+    # worker timings are sent back to the parent process
+    worker = pickle.loads(pickle.dumps(worker))
+
+    timings = Timings()
+    with timings.phase("plan", "other"):
+        pass
+    timings.merge(worker)
+    assert sorted(timings.projects) == ["app", "other"]
+    assert timings.phases["plan"]["wall"] == (
+        timings.projects["app"]["plan"]["wall"] + timings.projects["other"]["plan"]["wall"]
+    )
@@ -0,0 +1,248 @@
+import hashlib
+import io
+import os
+import tracemalloc
+import zipfile
+import zlib
+
+import pytest
+
+from poetry_plugin_freeze.cache import PlanCache
+from poetry_plugin_freeze.manifest import write_manifests
+from poetry_plugin_freeze.plan import FreezePlan, write_plan_file
+from poetry_plugin_freeze.wheel import (
+    COPY_BUFSIZE,
+    HashingWriter,
+    atomic_output,
+    copy_member_raw,
+    patch_wheel_in_place,
+    rewrite_wheel,
+)
+
+
+class Unseekable(io.RawIOBase):
+    """Write only stream, forces zipfile to emit data descriptors."""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+
+def build_archive():
+    stream = Unseekable()
+    with zipfile.ZipFile(stream, "w") as zf:
+        zf.writestr("pkg/stored.txt", b"stored" * 10, compress_type=zipfile.ZIP_STORED)
+        deflated = zipfile.ZipInfo("pkg/deflated.txt", (2020, 2, 2, 10, 20, 30))
+        deflated.external_attr = 0o100755 << 16
+        zf.writestr(deflated, b"deflated" * 100, compress_type=zipfile.ZIP_DEFLATED)
+    return stream.buf.getvalue()
+
+
+def test_copy_member_raw(raw_member_bytes):
+    source = zipfile.ZipFile(io.BytesIO(build_archive()))
+    assert all(i.flag_bits & 0x08 for i in source.infolist())
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as target:
+        for info in source.infolist():
+            copy_member_raw(source, target, info)
+
+    copied = zipfile.ZipFile(io.BytesIO(output.getvalue()))
+    assert copied.testzip() is None
+    for orig in source.infolist():
+        info = copied.getinfo(orig.filename)
+        assert info.compress_type == orig.compress_type
+        assert info.CRC == orig.CRC
+        assert info.date_time == orig.date_time
+        assert info.external_attr == orig.external_attr
+        assert info.flag_bits & 0x08 == 0
+        assert raw_member_bytes(copied, info) == raw_member_bytes(source, orig)
+        assert copied.read(info) == source.read(orig)
+
+
+def build_wheel(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return path
+
+
+WHEEL_MEMBERS = [
+    ("pkg/__init__.py", b"print('hello')\n" * 50),
+    ("pkg-1.0.dist-info/METADATA", b"Name: pkg\nVersion: 1.0\n"),
+    ("pkg-1.0.dist-info/WHEEL", b"Wheel-Version: 1.0\n"),
+    ("pkg-1.0.dist-info/RECORD", b"pkg/__init__.py,,\n"),
+]
+NEW_MEMBERS = [
+    ("pkg-1.0.dist-info/METADATA", b"Name: pkg\nVersion: 1.0\nRequires-Dist: attrs (==22.2.0)\n"),
+    ("pkg-1.0.dist-info/RECORD", b"pkg/__init__.py,,\npkg-1.0.dist-info/METADATA,,\n"),
+]
+
+
+def read_members(path):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+
+def test_patch_wheel_in_place(tmp_path):
+    patched = build_wheel(tmp_path / "patched.whl", WHEEL_MEMBERS)
+    rewritten = build_wheel(tmp_path / "rewritten.whl", WHEEL_MEMBERS)
+
+    assert patch_wheel_in_place(patched, NEW_MEMBERS) is True
+    rewrite_wheel(rewritten, NEW_MEMBERS)
+
+    assert read_members(patched) == read_members(rewritten)
+    assert read_members(patched) == [WHEEL_MEMBERS[0], WHEEL_MEMBERS[2]] + NEW_MEMBERS
+    assert patched.stat().st_size == rewritten.stat().st_size
+
+
+def test_patch_wheel_in_place_fallback(tmp_path):
+    wheel = build_wheel(tmp_path / "pkg.whl", WHEEL_MEMBERS)
+    contents = wheel.read_bytes()
+
+    # too much member data would have to be moved
+    assert patch_wheel_in_place(wheel, NEW_MEMBERS, max_move=0) is False
+    assert wheel.read_bytes() == contents
+
+    # archives with leading data
+    wheel.write_bytes(b"#!/bin/sh\n" + contents)
+    assert patch_wheel_in_place(wheel, NEW_MEMBERS) is False
+    assert wheel.read_bytes() == b"#!/bin/sh\n" + contents
+
+
+def test_copy_member_raw_zip64():
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as zf:
+        with zf.open("pkg/data.bin", "w", force_zip64=True) as fh:
+            fh.write(b"data" * 100)
+    source = zipfile.ZipFile(io.BytesIO(output.getvalue()))
+    info = source.getinfo("pkg/data.bin")
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as target:
+        copy_member_raw(source, target, info)
+
+    copied = zipfile.ZipFile(io.BytesIO(output.getvalue()))
+    assert copied.testzip() is None
+    assert copied.read("pkg/data.bin") == b"data" * 100
+    # the member is small, so no stale zip64 sizes are carried over
+    assert copied.getinfo("pkg/data.bin").extra == b""
+
+
+def chunks(size, chunk=b"0123456789abcdef" * 4096):
+    while size > 0:
+        yield chunk[:size]
+        size -= len(chunk)
+
+
+def test_rewrite_wheel_memory_bounded(tmp_path):
+    size = 48 * COPY_BUFSIZE
+    wheel = tmp_path / "pkg.whl"
+    with zipfile.ZipFile(wheel, "w") as zf:
+        with zf.open("pkg/model.bin", "w") as fh:
+            for chunk in chunks(size):
+                fh.write(chunk)
+        for name, data in WHEEL_MEMBERS[1:]:
+            zf.writestr(name, data)
+
+    members = NEW_MEMBERS + [("pkg/extra.bin", chunks(size))]
+    tracemalloc.start()
+    try:
+        rewrite_wheel(wheel, members)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * COPY_BUFSIZE
+
+    with zipfile.ZipFile(wheel) as zf:
+        assert zf.getinfo("pkg/model.bin").file_size == size
+        assert zf.getinfo("pkg/extra.bin").file_size == size
+        crc = 0
+        with zf.open("pkg/extra.bin") as fh:
+            while chunk := fh.read(COPY_BUFSIZE):
+                crc = zlib.crc32(chunk, crc)
+        assert crc == zf.getinfo("pkg/model.bin").CRC
+
+
+def test_rewrite_wheel_hashes(tmp_path):
+    wheel = build_wheel(tmp_path / "pkg.whl", WHEEL_MEMBERS)
+    hashes = {"sha256": hashlib.sha256(), "md5": hashlib.md5()}
+    members = NEW_MEMBERS + [("pkg/extra.bin", chunks(3 * COPY_BUFSIZE))]
+    rewrite_wheel(wheel, members, hashes)
+
+    content = wheel.read_bytes()
+    assert hashes["sha256"].hexdigest() == hashlib.sha256(content).hexdigest()
+    assert hashes["md5"].hexdigest() == hashlib.md5(content).hexdigest()
+    assert read_members(wheel)[-3:-1] == NEW_MEMBERS
+
+
+def test_hashing_writer_out_of_order():
+    out = HashingWriter(io.BytesIO(), {"sha256": hashlib.sha256()})
+    out.write(b"header")
+    out.seek(0)
+    with pytest.raises(ValueError):
+        out.write(b"H")
+
+    # writes within hold may go back to anywhere after what's hashed
+    with out.hold():
+        out.seek(6)
+        out.write(b"member")
+        out.seek(6)
+        out.write(b"M")
+        out.seek(12)
+    assert out.hashes["sha256"].hexdigest() == hashlib.sha256(b"headerMember").hexdigest()
+
+
+def test_rewrite_wheel_output(tmp_path):
+    wheel = build_wheel(tmp_path / "pkg.whl", WHEEL_MEMBERS)
+    os.chmod(wheel, 0o644)
+    original = wheel.read_bytes()
+    output = tmp_path / "out" / "pkg.whl"
+    output.parent.mkdir()
+
+    rewrite_wheel(wheel, NEW_MEMBERS, output_path=output)
+    assert wheel.read_bytes() == original
+    assert read_members(output)[-2:] == NEW_MEMBERS
+    assert os.stat(output).st_mode & 0o777 == 0o644
+
+    rewrite_wheel(wheel, NEW_MEMBERS)
+    assert wheel.read_bytes() == output.read_bytes()
+    assert os.stat(wheel).st_mode & 0o777 == 0o644
+
+
+def test_rewrite_wheel_failure(tmp_path, monkeypatch):
+    wheel = build_wheel(tmp_path / "pkg.whl", WHEEL_MEMBERS)
+    original = wheel.read_bytes()
+
+    def broken():
+        yield b"partial"
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        rewrite_wheel(wheel, NEW_MEMBERS + [("pkg/extra.bin", broken())])
+    # the temporary file was next to the wheel, and is gone
+    assert os.listdir(tmp_path) == ["pkg.whl"]
+    assert wheel.read_bytes() == original
+
+
+@pytest.mark.parametrize("umask", [0o022, 0o077])
+def test_atomic_output_mode(tmp_path, umask):
+    old_umask = os.umask(umask)
+    try:
+        with atomic_output(tmp_path / "plan.json", encoding="utf8") as fh:
+            fh.write("{}\n")
+        write_plan_file(tmp_path / "emitted.json", [])
+        PlanCache(tmp_path / "cache").put("key", FreezePlan("app", "1.0", "app-1.0.dist-info"))
+        write_manifests([(build_wheel(tmp_path / "pkg.whl", WHEEL_MEMBERS), {"sha256": "0"})])
+    finally:
+        os.umask(old_umask)
+    written = ["plan.json", "emitted.json", "cache/key.json", "SHA256SUMS", "manifest.json"]
+    assert {name: os.stat(tmp_path / name).st_mode & 0o777 for name in written} == {
+        name: 0o666 & ~umask for name in written
+    }